@@ -1,5 +1,6 @@
 from code.MySql.LoadMysql import StockPoolData
 import pandas as pd
+import sqlalchemy
 
 
 class PoolCount:
@@ -58,8 +59,6 @@ class PoolCount:
 
         data = pd.DataFrame(dic)
 
-        import sqlalchemy
-
         try:
             StockPoolData.append_poolCount(data)
 
@@ -1,4 +1,7 @@
+import os
 import pandas as pd
+import pymysql
+import sqlalchemy
 from code.MySql.LoadMysql import LoadNortFunds, StockPoolData, LoadFundsAwkward, StockData15m
 from code.Signals.BollingerSignal import Bollinger
 from code.Normal import MathematicalFormula as mfl
@@ -14,7 +17,6 @@ plt.rcParams['axes.unicode_minus'] = False
 
 
 def open_data_file():
-    import os
     start_directory = r'E:\Python\Project\Stock\Project_01\code\Dl_Strategy\Stock_RNN\data\output\stock_pool'
     os.startfile(start_directory)
 
@@ -389,7 +391,6 @@ class UpdateFakeStock(UpdateTradeHistory):  # 更新模拟账户交易数据
                     self.name, self.code, id_ = Stocks(stock)
                     positionNum = data.loc[index, '股票余额']
 
-                    import pymysql
                     try:
                         sql = f'''update {StockPoolData.db_pool}.{StockPoolData.tb_pool} set 
                         Position = 1, 
@@ -444,8 +445,6 @@ class UpdateFakeStock(UpdateTradeHistory):  # 更新模拟账户交易数据
 
             self.update_stock_pool()  # 更新止损价
 
-            import sqlalchemy
-
             try:
                 new_ = data.loc[index:index, :]
                 StockPoolData.append_tradeRecord(data=new_)
@@ -585,7 +584,6 @@ class UpdateRealStock(UpdateTradeHistory):  # 更新真实账户交易数据
                 data.loc[index, '信号编号'] = self.signalTimes_
                 data.loc[index, '成交数量'] = abs(data.loc[index, '成交数量'])
 
-                import sqlalchemy
                 try:
                     new_ = data.loc[index:index, :]
                     StockPoolData.append_tradeRecord(new_)
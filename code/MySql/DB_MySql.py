@@ -8,12 +8,18 @@ pd.set_option('display.max_columns', None)
 pd.set_option('display.width', 5000)
 
 
+PASSWORD = {}  # 数据库密码文件只读取一次
+
+
 def sql_password():
-    path_ = file_root()
-    path_ = f'{path_}/pp/sql.txt'
-    f = open(path_, 'r')
-    w = f.read()
-    return w
+    if 'sql' not in PASSWORD:
+        path_ = file_root()
+        path_ = f'{path_}/pp/sql.txt'
+
+        with open(path_, 'r') as f:
+            PASSWORD['sql'] = f.read()
+
+    return PASSWORD['sql']
 
 
 def sql_cursor(database: str):
@@ -32,12 +38,8 @@ def execute_sql(database: str, sql: str):
     return data
 
 
-def sql_data(database: str, sql: str):
-    cursor = sql_cursor(database)
-    cursor.execute(sql)
-    data = cursor.fetchall()
-    cursor.close()
-    return data
+# 与 execute_sql 完全相同, 直接绑定同一函数对象, 保留旧名供调用方使用
+sql_data = execute_sql
 
 
 def create_session(database: str):
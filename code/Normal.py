@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import os
+import copy
 import smtplib
 import time
 from email.message import Message
@@ -100,15 +101,13 @@ class StockCode:
             code = code[:6]
         return code
 
+    markets = {'6': 'SH', '0': 'SZ', '3': 'SZ'}  # 代码首位 -> 市场, 按首位查表, 不逐个比较
+
     @classmethod
     def code2market(cls, code):
-        if code[0] == '6':
-            market = 'SH'
-
-        elif code[0] == '0' or code[0] == '3':
-            market = 'SZ'
+        market = cls.markets.get(code[0])
 
-        else:
+        if market is None:
             market = 'None'
             print(f'股票: {code}未区分市场类；')
 
@@ -116,17 +115,13 @@ class StockCode:
 
     @classmethod
     def code_with_market(cls, code):
+        market = cls.markets.get(code[0])
 
-        if code[0] == '6':
-            code = f'{code}.SH'
-
-        elif code[0] == '0' or code[0] == '3':
-            code = f'{code}.SZ'
-
-        else:
+        if market is None:
             print(f'股票: {code}无市场分类;')
+            return code
 
-        return code
+        return f'{code}.{market}'
 
     @classmethod
     def code2classification(cls, code):
@@ -170,14 +165,28 @@ class StockCode:
 
 class ReadSaveFile:
 
+    _json_cache = {}  # path -> (文件修改时间, 解析结果)
+
+    @classmethod
+    def read_json_by_path(cls, path: str):
+        # 按路径缓存解析结果, 文件未被修改时不再打开文件; 其他进程 (股票池、训练) 改写文件后修改时间变化, 重新读取;
+        # 返回副本, 调用方修改不影响缓存
+        modified = os.path.getmtime(path)
+        cached = cls._json_cache.get(path)
+
+        if cached is None or cached[0] != modified:
+            with open(path, 'r') as lf:
+                cached = cls._json_cache[path] = (modified, json.load(lf))
+
+        return copy.deepcopy(cached[1])
+
     @classmethod
     def read_json(cls, months: str, code: str):
         _path = file_root()
         path = f'{_path}/data/{months}/json/{code}.json'
 
         try:
-            with open(path, 'r') as lf:
-                j = json.load(lf)
+            j = cls.read_json_by_path(path)
 
         except FileNotFoundError:
             j = {}
@@ -191,6 +200,8 @@ class ReadSaveFile:
         with open(path, 'w') as f:
             json.dump(dic, f)
 
+        cls._json_cache[path] = (os.path.getmtime(path), copy.deepcopy(dic))
+
     @classmethod
     def read_all_file(cls, path, ends):
         fl = []
@@ -212,18 +223,15 @@ class ResampleData:
 
     @classmethod
     def resample_fun(cls, data, parameter):
-        resampled_data = data.copy()
-        resampled_data['index_date'] = data['date']
-        resampled_data = resampled_data.set_index('index_date')
-        resampled_data = resampled_data.resample(parameter, closed='right', label='right').last()
-        resampled_data['open'] = resampled_data['open'].resample(parameter, closed='right', label='right').first()
-        resampled_data['high'] = resampled_data['high'].resample(parameter, closed='right', label='right').max()
-        resampled_data['low'] = resampled_data['low'].resample(parameter, closed='right', label='right').min()
-        resampled_data['volume'] = resampled_data['volume'].resample(parameter, closed='right', label='right').sum()
-        resampled_data['money'] = resampled_data['money'].resample(parameter, closed='right', label='right').sum()
+        # 一次 resample, 按列分别聚合: open 取区间第一根, high/low 取区间最高/最低, 成交量/额取区间合计;
+        # 此前各列均取区间最后一根 1m 数据, 已保存的 15m 数据由 DlDataCombine.rebuild_15m_ohlcv 重算
+        columns = ['date', 'open', 'close', 'high', 'low', 'volume', 'money']
+        resampled_data = data.set_index(data['date'].rename('index_date'))
+        resampled_data = resampled_data.resample(parameter, closed='right', label='right').agg(
+            {**{column: 'last' for column in resampled_data.columns},
+             'open': 'first', 'high': 'max', 'low': 'min', 'volume': 'sum', 'money': 'sum'})
         resampled_data = resampled_data.dropna(how='any').reset_index(drop=True)
-        resampled_data = resampled_data[['date', 'open', 'close', 'high', 'low', 'volume', 'money']]
-        return resampled_data
+        return resampled_data[columns]
 
     @classmethod
     def resample_1m_data(cls, data, freq):
@@ -235,14 +243,14 @@ class ResampleData:
             resample_data = cls.resample_fun(data=data, parameter='30T')
 
         elif freq == '60m':
-            morning_cutoff = pd.to_datetime('12:00:00').time()
-
-            data['minute_time'] = data['date'].dt.time
+            # 以当日分钟数 (整数) 区分上午/下午, 不生成 time 对象列, 也不再往传入数据中添加辅助列
+            morning_cutoff = 12 * 60
+            minute = data['date'].dt.hour.to_numpy() * 60 + data['date'].dt.minute.to_numpy()
 
-            m_df = data[data['minute_time'] < morning_cutoff]
+            m_df = data[minute < morning_cutoff]
             m_df = cls.resample_fun(data=m_df, parameter='90T')
 
-            a_df = data[data['minute_time'] > morning_cutoff]
+            a_df = data[minute > morning_cutoff]
             a_df = cls.resample_fun(data=a_df, parameter='60T')
 
             resample_data = pd.concat([m_df, a_df]).sort_values(by='date').reset_index(drop=True)
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 import pandas as pd
-from RnnRunModel import PredictionCommon
+from RnnRunModel import PredictionCommon, model_threads
 from code.MySql.LoadMysql import LoadRnnModel, StockPoolData
 from code.MySql.sql_utils import Stocks
 import matplotlib.pyplot as plt
@@ -13,45 +13,50 @@ pd.set_option('display.max_columns', None)
 pd.set_option('display.width', 1000)
 
 
-def stock_evaluate(day_, _num, num_, data, months, check_model):
+def evaluate_one_stock(day_, stock_, id_, months, check_model):
 
-    count = 0
+    db = LoadRnnModel.db_rnn
+    tb = LoadRnnModel.tb_train_record
+    check_date = pd.Timestamp('today').date()
 
-    for index in range(_num, num_):
+    try:
+        run = PredictionCommon(Stock=stock_, months=months, monitor=False, check_date=day_)
+        run.single_stock()
 
-        db = LoadRnnModel.db_rnn
-        tb = LoadRnnModel.tb_train_record
+        if check_model:
 
-        print(f'当前进度，剩余{num_ - _num - count}；')
+            sql2 = f'''update {db}.{tb} set 
+            ModelCheckTiming = '{pd.Timestamp('today')}',
+            ModelCheck = 'success',
+            ModelError = 'success',
+            ModelCheckTiming = '{check_date}' where id={id_};'''
 
-        stock_ = data.loc[index, 'code']
-        id_ = data.loc[index, 'id']
-        check_date = pd.Timestamp('today').date()
+            LoadRnnModel.rnn_execute_sql(sql2)
 
-        try:
-            run = PredictionCommon(Stock=stock_, months=months, monitor=False, check_date=day_)
-            run.single_stock()
+    except Exception as ex:
+
+        print(f'Error: {ex}')
 
-            if check_model:
+        if check_model:
+            sql2 = f'''update {db}.{tb} set 
+            ModelCheck = 'error',
+            ModelError = 'error',
+            ModelCheckTiming = '{check_date}' where id={id_};'''
+            LoadRnnModel.rnn_execute_sql(sql2)
 
-                sql2 = f'''update {db}.{tb} set 
-                ModelCheckTiming = '{pd.Timestamp('today')}',
-                ModelCheck = 'success',
-                ModelError = 'success',
-                ModelCheckTiming = '{check_date}' where id={id_};'''
 
-                LoadRnnModel.rnn_execute_sql(sql2)
+def stock_evaluate(day_, _num, num_, data, months, check_model):
+
+    count = 0
+
+    for index in range(_num, num_):
 
-        except Exception as ex:
+        print(f'当前进度，剩余{num_ - _num - count}；')
 
-            print(f'Error: {ex}')
+        stock_ = data.loc[index, 'code']
+        id_ = data.loc[index, 'id']
 
-            if check_model:
-                sql2 = f'''update {db}.{tb} set 
-                ModelCheck = 'error',
-                ModelError = 'error',
-                ModelCheckTiming = '{check_date}' where id={id_};'''
-                LoadRnnModel.rnn_execute_sql(sql2)
+        evaluate_one_stock(day_, stock_, id_, months, check_model)
 
         count += 1
 
@@ -64,20 +69,16 @@ def multiprocessing_count_pool(day_, months='2022-02', check_model=False):
 
     print(f'处理日期{day_}， 处理个数：{shape_}')
 
-    l1 = shape_ // 3
-    l2 = shape_ // 3 * 2
+    if not shape_:
+        return
 
-    p1 = multiprocessing.Process(target=stock_evaluate, args=(day_, 0, l1, data, months, check_model,))
-    p2 = multiprocessing.Process(target=stock_evaluate, args=(day_, l1, l2, data, months, check_model,))
-    p3 = multiprocessing.Process(target=stock_evaluate, args=(day_, l2, shape_, data, months, check_model,))
+    args = [(day_, data.loc[index, 'code'], data.loc[index, 'id'], months, check_model) for index in data.index]
 
-    p1.start()
-    p2.start()
-    p3.start()
+    # 按股票分配进程，进程数不超过 CPU 核数; 每个进程单线程运行模型，避免线程过载
+    processes = min(multiprocessing.cpu_count(), shape_)
 
-    p1.join()
-    p2.join()
-    p3.join()
+    with multiprocessing.Pool(processes=processes, initializer=model_threads, initargs=(1,)) as pool:
+        pool.starmap(evaluate_one_stock, args, chunksize=1)
 
 
 class RMHistoryCheck:
@@ -1,11 +1,21 @@
 # -*- coding: utf-8 -*-
 import pandas as pd
 from code.MySql.LoadMysql import StockPoolData
-from RnnRunModel import PredictionCommon
+from RnnRunModel import PredictionCommon, model_threads
 import multiprocessing
 from code.Normal import Useful
 
 
+def monitor_one_stock(Stock, months):
+    # 单股运行，模型在子进程内加载，避免跨进程传递
+    try:
+        run = PredictionCommon(Stock=Stock, months=months, monitor=True, check_date=None)
+        run.single_stock()
+
+    except Exception as ex:
+        print(f'{Stock}: {ex}；')
+
+
 class RMMonitor:
 
     def __init__(self, months='2022-02'):
@@ -37,13 +47,7 @@ class RMMonitor:
             print(f'{self.lines}\n回测进度：\n总股票数:{end_ - start_}个;'
                   f'剩余股票: {(end_ - start_ - i)}个;\n当前股票：{Stock};\n')
 
-            try:
-                run = PredictionCommon(Stock=Stock, months=self.months, monitor=True, check_date=None)
-                run.single_stock()
-
-            except Exception as ex:
-                print(f'{Stock}: {ex}；')
-                # pass
+            monitor_one_stock(Stock, self.months)
 
             i += 1
 
@@ -53,33 +57,14 @@ class RMMonitor:
 
         print(self.pool_data)
 
-        shapes = self.pool_data.shape[0]
-
-        if shapes > 4:
-
-            index1 = int(shapes * 0.25)
-            index2 = int(shapes * 0.5)
-            index3 = int(shapes * 0.75)
-
-            p1 = multiprocessing.Process(target=self.monitor_buy_stock, args=(0, index1,))
-            p2 = multiprocessing.Process(target=self.monitor_buy_stock, args=(index1, index2,))
-            p3 = multiprocessing.Process(target=self.monitor_buy_stock, args=(index2, index3,))
-            p4 = multiprocessing.Process(target=self.monitor_buy_stock, args=(index3, shapes,))
-
-            p1.start()
-            p2.start()
-            p3.start()
-            p4.start()
+        stocks = [(Stock, self.months) for Stock in self.pool_data['code']]
 
-            p1.join()
-            p2.join()
-            p3.join()
-            p4.join()
+        if stocks:
+            # 按股票分配进程，进程数不超过 CPU 核数; 每个进程单线程运行模型，避免线程过载
+            processes = min(multiprocessing.cpu_count(), len(stocks))
 
-        else:
-            p1 = multiprocessing.Process(target=self.monitor_buy_stock, args=(0, shapes,))
-            p1.start()
-            p1.join()
+            with multiprocessing.Pool(processes=processes, initializer=model_threads, initargs=(1,)) as pool:
+                pool.starmap(monitor_one_stock, stocks, chunksize=1)
 
     def monitor_position_stock(self):
 
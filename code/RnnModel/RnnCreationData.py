@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import numpy as np
 import pandas as pd
+import sqlalchemy
 from code.MySql.LoadMysql import StockData1m, StockData15m, LoadRnnModel
 from code.MySql.sql_utils import Stocks
 from code.parsers.RnnParser import *
@@ -423,7 +424,8 @@ class TrainingDataCalculate(ModelData):
 
         if self.RecordStartDate:
             self.data_1m = StockData1m.load_1m(self.stock_code, self.RecordStartDate)
-            self.data_1m = self.data_1m.sort_values(by=['date'])
+            if not self.data_1m['date'].is_monotonic_increasing:  # 按年份顺序读取, 通常已有序
+                self.data_1m = self.data_1m.sort_values(by=['date'], kind='stable')
             self.start_date_1m = self.data_1m.iloc[0]['date']
 
             self.data_1m = self.data_1m[
@@ -432,7 +434,8 @@ class TrainingDataCalculate(ModelData):
 
         else:
             self.data_1m = StockData1m.load_1m(self.stock_code, self.start_date)
-            self.data_1m = self.data_1m.sort_values(by=['date'])
+            if not self.data_1m['date'].is_monotonic_increasing:  # 按年份顺序读取, 通常已有序
+                self.data_1m = self.data_1m.sort_values(by=['date'], kind='stable')
             self.start_date_1m = self.data_1m.iloc[0]['date']
 
             self.data_1m = self.data_1m[(self.data_1m['date'] > pd.to_datetime(self.start_date)) &
@@ -447,7 +450,6 @@ class TrainingDataCalculate(ModelData):
 
         if self.RecordStartDate:
             self.data_15m = self.data_15m[self.data_15m['date'] > self.RecordEndDate]
-            import sqlalchemy
             try:
                 StockData15m.append_15m(data=self.data_15m, code_=self.stock_code)
 
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
+import os
 import pandas as pd
 import numpy as np
+import tensorflow as tf
 from keras.models import load_model
 from keras import backend as k
 from code.downloads.DlDataCombine import download_1m
@@ -15,12 +17,57 @@ import matplotlib.pyplot as plt
 from root_ import file_root
 from code.TrendDistinguish.TrendDistinguishRunModel import TrendDistinguishModel
 
+try:  # 监控 1m 快照优先存为 parquet, 读写更快且保留列类型; 未安装 pyarrow 时存为 csv
+    import pyarrow
+    USE_PARQUET = True
+
+except ImportError:
+    USE_PARQUET = False
+
 plt.rcParams['font.sans-serif'] = ['FangSong']
 pd.set_option('display.max_columns', None)
 pd.set_option('display.width', 1000)
 
 
+def model_threads(num=None):
+    # TensorFlow 线程数, 进程启动时设置一次; 运行时初始化后不可再修改
+    num = num or os.cpu_count()
+
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(num)
+        tf.config.threading.set_inter_op_parallelism_threads(num)
+
+    except RuntimeError as ex:
+        print(f'TensorFlow threads setting error: {ex}')
+
+
+model_threads()
+
+
 class Parsers:
+    # 全部实例变量在此声明; 子类 ModelData, DlModel, UpdateData, TradingAction 使用空 __slots__,
+    # PredictionCommon 多重继承时才不会产生 layout 冲突
+    __slots__ = ('lines', 'line', '_path',
+                 'stock_name', 'stock_code', 'stock_id', 'months',
+                 'jsons', 'freq', 'monitor',
+                 'data_1m', 'data_15m', 'records', 'checking_data', 'time_15m', 'check_date',
+                 'trendLabel', 'trendValue',
+                 'predict_length', 'predict_CycleChange', 'predict_CyclePrice', 'predict_BarVolume',
+                 'real_length', 'real_CycleChange', 'real_CyclePrice', 'real_BarVolume',
+                 'predict_bar_change', 'real_bar_change', 'predict_bar_price',
+                 'position', 'close', 'stopLoss', 'ExpPrice', 'score_trends', 'ScoreP',
+                 'sellAction', 'buyAction', 'reTrend', 'signal', 'updown', 'signalValue', 'tradAction',
+
+                 # ModelData
+                 'db_rnn_model', 'tb_rnn_record',
+
+                 # DlModel
+                 'predict_data', 'model_alpha', 'model_name', 'X', '_bounds',
+
+                 # UpdateData
+                 'current', 'signalTimes', '_signalTimes', 'signalStartTime',
+                 'change_max', 'trade_timing', 'position_action', 'trend_score',
+                 'RunDate', 'trade_boll', '_limitTradeTiming')
 
     def __init__(self, freq='15m'):
 
@@ -60,6 +107,7 @@ class Parsers:
 
 
 class ModelData(Parsers):
+    __slots__ = ()
 
     def __init__(self):
 
@@ -86,25 +134,41 @@ class ModelData(Parsers):
             self.time_15m = time1m
             print(f'Select 1m data Date Error: {ex}')
 
+        # 用 searchsorted 切片代替布尔筛选; 各年份表读取时未排序, 乱序时先排序
         data_1m = StockData1m.load_1m(self.stock_code, str(time1m.year))
-        data_1m = data_1m[data_1m['date'] > time1m].drop_duplicates(subset=['date']).reset_index(drop=True)
+
+        if not data_1m['date'].is_monotonic_increasing:
+            data_1m = data_1m.sort_values(by=['date'], kind='stable')
+
+        start_ = data_1m['date'].to_numpy().searchsorted(np.datetime64(time1m), side='right')
+        data_1m = data_1m.iloc[start_:].drop_duplicates(subset=['date']).reset_index(drop=True)
 
         if self.monitor:
             data_ = download_1m(self.stock_name, self.stock_code, days=1)
 
-            path = f'{self._path}/data/input/monitor/1m/{self.stock_code}.csv'
+            path = f'{self._path}/data/input/monitor/1m/{self.stock_code}'
             if data_.shape[0]:
-                data_.to_csv(path, index=False)
+                if USE_PARQUET:
+                    data_.to_parquet(f'{path}.parquet', compression='snappy', index=False)
+
+                else:
+                    data_.to_csv(f'{path}.csv', index=False)
+
+            elif USE_PARQUET:
+                data_ = pd.read_parquet(f'{path}.parquet')  # 保留列类型, 无需重新解析日期
 
             else:
-                data_ = pd.read_csv(path)
+                data_ = pd.read_csv(f'{path}.csv', parse_dates=['date'])
 
             self.data_1m = pd.concat([data_1m, data_], ignore_index=True)
 
+            if not self.data_1m['date'].is_monotonic_increasing:  # Bar1mVolumeMax 按日期二分查找
+                self.data_1m = self.data_1m.sort_values(by=['date'], kind='stable').reset_index(drop=True)
+
         else:
             date_ = self.check_date + pd.Timedelta(days=1)
-            data_1m = data_1m[data_1m['date'] < date_]
-            self.data_1m = data_1m.drop_duplicates(subset=['date']).reset_index(drop=True)
+            end_ = data_1m['date'].to_numpy().searchsorted(np.datetime64(date_), side='left')
+            self.data_1m = data_1m.iloc[:end_]
 
     def column2normal(self, column: str, match: str):
         max_ = self.jsons[match]['num_max']
@@ -116,8 +180,12 @@ class ModelData(Parsers):
     def Bar1mVolumeMax(self, x, num: int):
         st = x + pd.Timedelta(minutes=-15)
         ed = x
-        max_vol = self.data_1m[(self.data_1m['date'] > st) &
-                               (self.data_1m['date'] < ed)].sort_values(by=['volume'])['volume'].tail(num).mean()
+
+        # data_1m 已在 read_1m 中按日期升序, 二分查找 (st, ed) 区间, 避免每根 bar 扫描全部 1m 数据
+        dates = self.data_1m['date'].to_numpy()
+        lo = dates.searchsorted(np.datetime64(st), side='right')
+        hi = dates.searchsorted(np.datetime64(ed), side='left')
+        max_vol = self.data_1m['volume'].iloc[lo:hi].sort_values().tail(num).mean()
         try:
             max_vol = int(max_vol)
 
@@ -136,7 +204,7 @@ class ModelData(Parsers):
         _end_date = sql_data(database='stock_15m_data', sql=sql1)[0][0]
         end_date = self.data_15m.iloc[-1]['date']
 
-        if _end_date < end_date and _end_date not in list(self.data_15m['date']):
+        if _end_date < end_date and not (self.data_15m['date'] == _end_date).any():
             sql2 = f'''delete from {db}.`{self.stock_code}` where date='{_end_date}';'''
             StockData15m.data15m_execute_sql(sql2)
 
@@ -291,6 +359,7 @@ class ModelData(Parsers):
 
 
 class DlModel(Parsers):
+    __slots__ = ()
 
     def __init__(self, model_alpha=1):
         Parsers.__init__(self)
@@ -298,15 +367,26 @@ class DlModel(Parsers):
         self.model_alpha = model_alpha
         self.model_name = ModelName
         self.X = XColumn()
+        self._bounds = {}
+
+    def normal_bounds(self, match: str):
+        # 归一化参数 (min, max - min) 每只股票只需读取一次
+        bounds = self._bounds.get(match)
 
-    def normal2value(self, data: float, match: str):
-        high = self.jsons[match]['num_max']
-        low = self.jsons[match]['num_min']
-        num_normal = data * (high - low) + low
+        if bounds is None:
+            low = self.jsons[match]['num_min']
+            bounds = (low, self.jsons[match]['num_max'] - low)
+            self._bounds[match] = bounds
+
+        return bounds
+
+    def normal2value(self, data, match: str):
+        # data 可为单值或 numpy 数组, 整体一次反归一化
+        low, span = self.normal_bounds(match)
+        num_normal = data * span + low
         return num_normal
 
     def predictive_value(self, model_name, x):
-        k.clear_session()
         path = f'{self._path}/data/{self.months}/model/{model_name}_{self.stock_code}.h5'
         model = load_model(path)
         val = model.predict(x)
@@ -364,6 +444,7 @@ class DlModel(Parsers):
 
 
 class UpdateData(Parsers):
+    __slots__ = ()
 
     def __init__(self):
         Parsers.__init__(self)
@@ -409,7 +490,7 @@ class UpdateData(Parsers):
         ScoreTrends = '{self.trend_score}',
         TradePoint = '{self.tradAction}',
         TimeRunBar = '{self.trade_timing}',
-        RenewDate = '{pd.Timestamp('today').date()}'
+        RenewDate = '{self.current}'
         where id = '{self.stock_id}';'''
 
         LoadRnnModel.rnn_execute_sql(sql1)
@@ -432,6 +513,7 @@ class UpdateData(Parsers):
 
 
 class TradingAction(Parsers):
+    __slots__ = ()
 
     def __init__(self):
         Parsers.__init__(self)
@@ -447,6 +529,7 @@ class TradingAction(Parsers):
 
 
 class PredictionCommon(ModelData, DlModel, UpdateData):
+    __slots__ = ('alpha', 'checking', '_endPriceTime', '_limitPrice', 'area')
 
     def __init__(self, Stock, months: str, monitor: bool, check_date, alpha=1, stopLoss=None, position=None):
 
@@ -504,8 +587,9 @@ class PredictionCommon(ModelData, DlModel, UpdateData):
     # 买卖点记录
     def report_trade(self):  # 交易点信息
 
-        shapes = self.records[(self.records['RenewDate'] != self.current) &
-                              (self.records['TradePoint'] != 0)].shape[0]
+        # 只统计个数, 不生成筛选后的 DataFrame
+        traded = (self.records['RenewDate'] != self.current) & (self.records['TradePoint'] != 0)
+        shapes = int(np.count_nonzero(traded.to_numpy()))
         if not shapes:
 
             title = f'股票:{self.stock_name},代码：{self.stock_code}; 触发{self.position_action}信号;'
@@ -823,35 +907,39 @@ class PredictionCommon(ModelData, DlModel, UpdateData):
     @count_times
     def single_stock(self):  # 单股循环
 
-        # 生成数据 data_1m, data_15m, checking_data, checking
-        self.checking_data = self.calculate_check_data()
-        # print(self.checking_data)
-        # exit()
-        if self.checking_data.shape[0]:  # 判断check date data 是否为空
+        try:
+            # 生成数据 data_1m, data_15m, checking_data, checking
+            self.checking_data = self.calculate_check_data()
+            # print(self.checking_data)
+            # exit()
+            if self.checking_data.shape[0]:  # 判断check date data 是否为空
+
+                for s_ in self.checking_data.drop_duplicates(subset=[SignalTimes])[SignalTimes]:  # 判断 SignalTimes 个数
+                    self.checking = self.checking_data[self.checking_data[SignalTimes] == s_]
 
-            for s_ in self.checking_data.drop_duplicates(subset=[SignalTimes])[SignalTimes]:  # 判断 SignalTimes 个数
-                self.checking = self.checking_data[self.checking_data[SignalTimes] == s_]
+                    self.get_bar_data()  # 获取当前Bar 各个数据值
 
-                self.get_bar_data()  # 获取当前Bar 各个数据值
+                    # 周期点预测，需先判断是否运行模型
+                    self.predict_cycle_values()
+                    self.predict_bar_values()
 
-                # 周期点预测，需先判断是否运行模型
-                self.predict_cycle_values()
-                self.predict_bar_values()
+                    self.trade_point_score()  # 趋势得分
 
-                self.trade_point_score()  # 趋势得分
+                    # 更新数据
+                    self.update_RecordRun()
+                    self.update_Data15m()
+                    self.update_StockPool()  # 更新股票池
 
-                # 更新数据
-                self.update_RecordRun()
-                self.update_Data15m()
-                self.update_StockPool()  # 更新股票池
+                    if self.trade_boll:
+                        self.report_trade()
 
-                if self.trade_boll:
-                    self.report_trade()
+                    if self.position:
+                        self.report_position()
 
-                if self.position:
-                    self.report_position()
+                    self.report_run()  # 显示运行结果
 
-                self.report_run()  # 显示运行结果
+        finally:
+            k.clear_session()  # 单股结束 (含异常退出) 后释放模型, 不在每次预测时清理
 
 
 if __name__ == '__main__':
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import logging
 import time
 import pandas as pd
 from downloads.DlStockData import RMDownloadData
@@ -62,4 +63,6 @@ def monitor(months='2022-02'):
 
 
 if __name__ == '__main__':
+    # 下载、更新进度等信息经 logging 输出, 入口处配置一次, 否则 INFO 级别信息不会显示
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
     monitor()
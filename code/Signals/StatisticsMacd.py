@@ -257,27 +257,22 @@ class StatisticsMACD:
         return data
 
     @classmethod
-    def find_Daily1mMax(cls, x, num, data1m):
-        st_date = pd.to_datetime(x.date())
-        ed_date = st_date + pd.Timedelta(days=1)
+    def s_Daily1mMax(cls, data, data1m):  # 找出每天最大的 1根，5根，15根 1分钟成交量
+        fills = [Daily1mVolMax1, Daily1mVolMax5, Daily1mVolMax15]
 
-        # 使用 between 方法简化日期范围的条件
-        select = data1m[data1m['date'].between(st_date, ed_date, inclusive=False)]
+        # 以当日分钟数 (整数) 定位 09:45, 不生成 time 对象列
+        minute = data['date'].dt.hour * 60 + data['date'].dt.minute
+        con = (minute == 9 * 60 + 45).to_numpy()
+        days = data.loc[con, 'date'].dt.normalize()
 
-        # 将最大交易量转换为整数
-        max_volume = select.sort_values(by='volume')['volume'].tail(num).mean()
-        max_volume = int(max_volume)
+        # 1m数据按成交量降序排列一次, 按日分组取前 num 根求均值; 不再每个交易日扫描、排序一次整表
+        volume = pd.DataFrame({'day': data1m['date'].dt.normalize(), 'volume': data1m['volume']})
+        volume = volume.sort_values(by='volume', ascending=False, kind='stable')
 
-        return max_volume
+        for column, num in zip(fills, [1, 5, 15]):
+            tops = volume.groupby('day').head(num).groupby('day')['volume'].mean().astype('int64')
+            data.loc[con, column] = days.map(tops).to_numpy()
 
-    @classmethod
-    def s_Daily1mMax(cls, data, data1m):  # 找出每天最大的 1根，5根，15根 1分钟成交量
-        fills = [Daily1mVolMax1, Daily1mVolMax5, Daily1mVolMax15]
-        data['minute_date'] = data['date'].dt.time
-        con = data['minute_date'] == pd.to_datetime('09:45:00').time()
-        data.loc[con, Daily1mVolMax1] = data.loc[con, 'date'].apply(cls.find_Daily1mMax, args=(1, data1m,))
-        data.loc[con, Daily1mVolMax5] = data.loc[con, 'date'].apply(cls.find_Daily1mMax, args=(5, data1m,))
-        data.loc[con, Daily1mVolMax15] = data.loc[con, 'date'].apply(cls.find_Daily1mMax, args=(15, data1m,))
         data[fills] = data[fills].fillna(method='ffill')
         return data
 
@@ -320,7 +315,6 @@ class SignalMethod:
 
         data = StatisticsMACD.s_CycleLength(data)  # 统计周期长度
 
-        data = data.drop(columns=['minute_date'])
         data = Bollinger(data=data)  # 找出boll通道价格
         return data
 
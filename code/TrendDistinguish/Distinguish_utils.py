@@ -1,3 +1,4 @@
+import matplotlib
 import numpy as np
 import pandas as pd
 from code.MySql.LoadMysql import StockData1m
@@ -5,14 +6,12 @@ from code.Normal import ResampleData
 from code.Signals.BollingerSignal import Bollinger
 from code.Signals.MacdSignal import calculate_MACD
 
+matplotlib.use('agg')
 
-def array_data(data, figName, showTicks=False):
-
-    import matplotlib
+import matplotlib.pyplot as plt
 
-    matplotlib.use('agg')
 
-    import matplotlib.pyplot as plt
+def array_data(data, figName, showTicks=False):
 
     fig, ax = plt.subplots(nrows=2, ncols=1, figsize=(1.5, 2))
 
@@ -1,24 +1,103 @@
 # -*- coding: utf-8 -*-
+import datetime
+import os
 from DlJuQuan import DownloadData as dlj
 from DlEastMoney import DownloadData as dle
-from code.MySql.LoadMysql import LoadFundsAwkward, LoadBasicInform, StockData1m
+from code.MySql.LoadMysql import LoadFundsAwkward, LoadBasicInform, StockData1m, StockData15m, LoadRnnModel
+from code.Normal import ResampleData
+from download_utils import CACHE_DIR
 from code.RnnModel.Rnn_utils import date_range
 from code.MySql.DB_MySql import MysqlAlchemy as ml
+import logging
 import pandas as pd
 import pandas
-import time
+
+try:  # 分时缓存优先存为 parquet, 读写更快且保留列类型; 未安装 pyarrow 时存为 csv
+    import pyarrow
+    USE_PARQUET = True
+
+except ImportError:
+    USE_PARQUET = False
 
 pd.set_option('display.max_columns', None)
 pd.set_option('display.width', 5000)
 
+logger = logging.getLogger(__name__)
+
+MINUTE_CACHE_DIR = os.path.join(CACHE_DIR, 'minute')  # 分时数据缓存, 按 (代码, 日期) 存放
+MARKET_OPEN = datetime.time(9, 30)
+MARKET_CLOSE = datetime.time(15, 0)
+
+
+def minute_cache_path(code, date_):
+    return os.path.join(MINUTE_CACHE_DIR, f"{code}_{date_}.{'parquet' if USE_PARQUET else 'csv'}")
+
+
+def read_minute_cache(path):
+    try:
+        if USE_PARQUET:
+            return pd.read_parquet(path)
+
+        return pd.read_csv(path, parse_dates=['date'])
+
+    except (OSError, ValueError):  # 无缓存 或 缓存文件损坏
+        return None
+
+
+def write_minute_cache(path, data):
+    os.makedirs(MINUTE_CACHE_DIR, exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+
+    if USE_PARQUET:
+        data.to_parquet(tmp, compression='snappy', index=False)
+
+    else:
+        data.to_csv(tmp, index=False)
+
+    os.replace(tmp, path)  # 原子替换, 多进程读取时不会读到半个文件
+
+
+def last_days(data, days):
+    # 保留最近 days 个交易日的数据
+    day = data['date'].dt.normalize()
+    return data[day.isin(day.drop_duplicates().tail(days))].reset_index(drop=True)
+
 
 def download_1m(stock, code, days):
+    """
+    分时数据按 (代码, 当日日期) 缓存在磁盘:
+    缓存已含 days 个交易日且在收盘后 (或当日开盘前) 写入时, 直接返回缓存, 不再请求;
+    盘中只重新下载当天数据, 替换缓存中当天部分, 此前各日沿用缓存, 不再每次下载整个 days 窗口;
+    """
+    now = pd.Timestamp('today')
+    path = minute_cache_path(code, now.date())
+    cached = read_minute_cache(path)
 
     try:
-        data_1m = dle.stock_1m_multiple(code, days=days)
+        if cached is not None and cached.shape[0] and cached['date'].dt.normalize().nunique() >= days:
+            written = pd.Timestamp.fromtimestamp(os.path.getmtime(path)).time()
+
+            if written > MARKET_CLOSE or now.time() < MARKET_OPEN:
+                return last_days(cached, days)
+
+            data_1m = dle.stock_1m_multiple(code, days=1)
+
+            if data_1m.shape[0]:
+                start_ = data_1m['date'].iloc[0].normalize()
+                data_1m = pd.concat([cached[cached['date'] < start_], data_1m], ignore_index=True)
+
+            else:
+                data_1m = cached
+
+        else:
+            data_1m = dle.stock_1m_multiple(code, days=days)
+
+        if data_1m.shape[0]:
+            write_minute_cache(path, data_1m)
+            data_1m = last_days(data_1m, days)
 
     except Exception as ex:
-        print(f'东方财富下载{stock}1m数据异常：{ex};')
+        logger.error('东方财富下载%s1m数据异常：%s;', stock, ex)
         data_1m = pd.DataFrame()
 
     return data_1m
@@ -37,7 +116,7 @@ def collect_full_data1m():  # 补充 完整的 1m_data 数据库;
                   (basic['EndDate'] < pd.Timestamp('today')) &
                   (~basic['Classification'].isin(['科创板', '创业板']))].reset_index(drop=True)
 
-    print(basic)
+    logger.debug('待补充1m数据:\n%s', basic)  # 仅 DEBUG 级别才渲染整张表
     over_ = ''
     over = '您的1000万条体验期已结束'
 
@@ -60,7 +139,7 @@ def collect_full_data1m():  # 补充 完整的 1m_data 数据库;
                     end_ = (pd.to_datetime(record_start) + pd.Timedelta(days=-1)).date()
                     start_ = pd.to_datetime(f'{year_}-01-01').date()
 
-                    print(f'下载： {name}, {code},时间段 {start_} 至 {end_}；')
+                    logger.debug('下载： %s, %s,时间段 %s 至 %s；', name, code, start_, end_)
 
                     if start_ <= end_:
                         try:
@@ -73,8 +152,13 @@ def collect_full_data1m():  # 补充 完整的 1m_data 数据库;
                                     _data = StockData1m.load_1m(code, _year=year_)
                                     data1m = pd.concat([data1m, _data], ignore_index=True)
 
-                                    data1m = data1m.drop_duplicates(subset=['date']). \
-                                        sort_values(by=['date']).reset_index(drop=True)
+                                    data1m = data1m.drop_duplicates(subset=['date'])
+
+                                    # 补充的历史数据在前, 已有数据在后, 通常已有序, 乱序时才排序
+                                    if not data1m['date'].is_monotonic_increasing:
+                                        data1m = data1m.sort_values(by=['date'], kind='stable')
+
+                                    data1m = data1m.reset_index(drop=True)
 
                                     StockData1m.replace_1m(code_=code, year_=str(year_), data=data1m)
 
@@ -89,12 +173,11 @@ def collect_full_data1m():  # 补充 完整的 1m_data 数据库;
                                 StartDate = '{start_new}' where id = {id_};'''
                                 LoadBasicInform.basic_execute_sql(sql=sql)
 
-                                print(f'下载成功: {name}, {code} 1m 数据;')
-                                time.sleep(10)
+                                logger.info('下载成功: %s, %s 1m 数据;', name, code)
 
                         except Exception as ex:
 
-                            print(f'下载 {name}, {code} 1m数据异常;\n{ex}')
+                            logger.error('下载 %s, %s 1m数据异常;\n%s', name, code, ex)
 
                             if str(ex) == 'Cannot convert non-finite values (NA or inf) to integer':  # 数据下载错误时
 
@@ -111,7 +194,43 @@ def collect_full_data1m():  # 补充 完整的 1m_data 数据库;
                         break
 
     else:
-        print('无历史分时数据需下载;')
+        logger.info('无历史分时数据需下载;')
+
+
+def rebuild_15m_ohlcv():
+    """
+    ResampleData.resample_fun 改为按区间聚合 open/high/low/volume/money 后, 用 1m 数据重算已保存 15m 数据的这五列,
+    使历史数据与新追加的数据一致; date、close 及由收盘价计算的信号列不变;
+    重算后 15m 数据的 volume 等特征已变化, 各股 RNN 模型及其归一化参数需重新训练;
+    """
+    columns = ['open', 'high', 'low', 'volume', 'money']
+
+    for code in LoadRnnModel.load_run_record()['code'].drop_duplicates():
+
+        try:
+            data15m = StockData15m.load_15m(code)
+
+            if not data15m.shape[0]:
+                continue
+
+            data1m = StockData1m.load_1m(code, str(data15m['date'].min().year)).drop_duplicates(subset=['date'])
+
+            if not data1m['date'].is_monotonic_increasing:
+                data1m = data1m.sort_values(by=['date'], kind='stable')
+
+            bars = ResampleData.resample_1m_data(data=data1m, freq='15m').set_index('date')
+
+            # 1m 数据缺失的 bar 保留原值
+            matched = data15m['date'].isin(bars.index).to_numpy()
+            data15m.loc[matched, columns] = bars.loc[data15m.loc[matched, 'date'], columns].to_numpy()
+
+            StockData15m.replace_15m(code_=code, data=data15m)
+            logger.info('重算15m数据: %s, %s/%s 根 bar;', code, matched.sum(), matched.shape[0])
+
+        except Exception as ex:
+            logger.error('重算%s 15m数据异常: %s', code, ex)
+
+    logger.warning('15m 数据已按新的区间聚合方式重算, 各股 RNN 模型需重新训练;')
 
 
 def download_full_north_funds_to_board(start_: str, end_: str):
@@ -127,14 +246,13 @@ def download_full_north_funds_to_board(start_: str, end_: str):
 
         _date = ml.pd_read(database='northfunds', table='toboard')
         _date = _date[_date['TRADE_DATE'] >= pd.to_datetime(start_)]
-        _date = _date.drop_duplicates(['TRADE_DATE'])
-        _date = list(_date['TRADE_DATE'])
+        _date = set(_date['TRADE_DATE'])  # 已下载日期, 集合查找
 
         date_ = date_range(start_, end_)
 
         date_ = [i for i in date_ if i not in _date]
 
-        print(date_)
+        logger.debug('待下载日期: %s', date_)
 
         if not len(date_):
             t = 0
@@ -142,24 +260,25 @@ def download_full_north_funds_to_board(start_: str, end_: str):
         if len(date_):
             t = t - 1
 
-            for d in date_:
-                d = d.strftime('%Y-%m-%d')
-                dl = dle.funds_to_sectors(d)
+            # 缺失日期并发下载, 再依次保存
+            dates = [d.strftime('%Y-%m-%d') for d in date_]
+            downloads = dle.funds_to_sectors_many(dates)
+
+            for d in dates:
+                dl = downloads[d]
 
                 if not dl.shape[0]:
-                    time.sleep(5)
                     continue
 
                 df = pd.concat([df, dl])
 
                 ml.pd_append(dl, 'northfunds', 'toboard')
 
-                time.sleep(5)
-
     return df
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     s = '2022-05-01'
     e = '2022-08-08'
     d = download_full_north_funds_to_board(s, e)
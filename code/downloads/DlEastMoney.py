@@ -1,20 +1,96 @@
 # -*- coding: utf-8 -*-
-import time
-import json
+import io
+import logging
 import re
-from selenium import webdriver
-from bs4 import BeautifulSoup as soup
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import MappingProxyType
+from bs4 import BeautifulSoup as soup, SoupStrainer
+from selenium.webdriver.support.ui import WebDriverWait
+from lxml import html as lxml_html
+import numpy as np
 import pandas as pd
-from download_utils import page_source, WebDriver
+from download_utils import get_response, response_text, page_source, cached_page_source, driver_pool, UrlCode, \
+    json_loads
 from root_ import file_root
-from download_utils import UrlCode
+
+try:  # selectolax 以 C 实现 css 选择, 解析基金页更快; 未安装时使用 BeautifulSoup
+    from selectolax.lexbor import LexborHTMLParser
+
+except ImportError:
+    LexborHTMLParser = None
+
+try:  # 代码、名称等字符串列以 Arrow 连续内存存储; 未安装 pyarrow 时使用 pandas 自带 string 类型
+    import pyarrow
+    STRING_DTYPE = 'string[pyarrow]'
+
+except ImportError:
+    STRING_DTYPE = 'string'
+
+logger = logging.getLogger(__name__)
+
+HEADERS = {}  # pp -> 只读请求头, 需要修改时由调用方 dict(headers) 复制
+URLS = {}  # pp -> 网址模板
+
+# 北向资金个股表格当前首行文本, 用于判断翻页是否完成
+FIRST_ROW_JS = "var r = document.evaluate('(//table)[2]//tr[td]', document, null, 9, null).singleNodeValue;" \
+               "return r ? r.innerText : null;"
+
+# 按 xpath 列表返回各节点文本
+XPATH_TEXTS_JS = "return arguments[0].map(function (p) {" \
+                 "return document.evaluate(p, document, null, 2, null).stringValue.trim(); });"
+
+# 行业板块列表: [[板块名称, 板块代码], ...]
+INDUSTRY_BOARDS_JS = "return Array.from(document.querySelectorAll('li.sub-items.menu-industry_board-wrapper li'))" \
+                     ".map(function (li) { return [li.querySelector('.text').innerText," \
+                     " li.querySelector('a').getAttribute('href').trim().slice(-6)]; });"
+
+# 北向资金个股接口 (数据中心 RPT_MUTUAL_STOCK_NORTHSTA) 字段 -> 列名, 与 return_FundsData 解析网页表格所得列一致;
+# 与其他接口一样由本地配置两个文件 (在项目根目录 pp/EastMoney 下), 缺少任一文件时 funds_to_stock 使用浏览器翻页:
+#   Url_funds_to_stock.txt: 一行网址模板, {} 处填页码, 例如
+#     https://datacenter-web.eastmoney.com/api/data/v1/get?reportName=RPT_MUTUAL_STOCK_NORTHSTA&columns=ALL
+#     &source=WEB&client=WEB&sortColumns=ADD_MARKET_CAP&sortTypes=-1&pageSize=50&pageNumber={}
+#     &filter=(INTERVAL_TYPE="1")(MUTUAL_TYPE="001")   (以上为同一行)
+#   header_funds_to_stock.txt: 每行 名称:值 的请求头, 例如 User-Agent:Mozilla/5.0
+FUNDS_TO_STOCK_URL = 'pp/EastMoney/Url_funds_to_stock.txt'
+FUNDS_TO_STOCK_COLUMNS = {'TRADE_DATE': 'trade_date', 'SECURITY_CODE': 'stock_code',
+                          'SECURITY_NAME': 'stock_name', 'INDUSTRY_NAME': 'industry'}
+
+# 货币单位 -> 倍数; 数值与单位整列一次拆开, 单位可能为两个字 (百万、千万)
+MONEY_UNITS = {'亿': 1e8, '万': 1e4, '百万': 1e6, '千万': 1e7}
+MONEY_VALUE = r'^\s*(-?[\d.]+)\s*(\D*)\s*$'
+
+STOCK_CODE = re.compile(r'\d{6}')  # 6 位股票代码
+BLANKS = str.maketrans('', '', ' \n\r\t')  # 网页文本中需删除的空白字符
+
+POSITION_SHARES = SoupStrainer('li', class_='position_shares')  # 基金页持仓表
+
+BROWSER_HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                                 '(KHTML, like Gecko) Chrome/104.0.0.0 Safari/537.36',
+                   'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                   'Accept-Language': 'zh-CN,zh;q=0.9'}
+
+# 基金页请求失败时依次换用的请求头
+BROWSER_HEADER_SETS = (BROWSER_HEADERS,
+                       dict(BROWSER_HEADERS, **{'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:103.0) '
+                                                              'Gecko/20100101 Firefox/103.0'}),
+                       dict(BROWSER_HEADERS, **{'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) '
+                                                              'AppleWebKit/605.1.15 (KHTML, like Gecko) '
+                                                              'Version/15.6 Safari/605.1.15'}))
 
 
 def data_headers(pp: str):
+    # 请求头文件只解析一次; 之后返回同一个只读视图, 不再每次请求都读文件、复制 dict
+    headers = HEADERS.get(pp)
+
+    if headers is not None:
+        return headers
+
     _path = file_root()
     pph = f'{_path}/pp/EastMoney/header_{pp}.txt'
-    f2 = open(pph, 'r')
-    lines = f2.readlines()
+
+    with open(pph, 'r') as f2:
+        lines = f2.readlines()
+
     headers = {}
 
     for line in lines:
@@ -25,125 +101,157 @@ def data_headers(pp: str):
         values = line[1]
         headers[keys] = values
 
+    headers = HEADERS[pp] = MappingProxyType(headers)
     return headers
 
 
 def data_url(pp: str):
+    # 网址模板文件只读取一次, 之后直接返回缓存的模板
+    url = URLS.get(pp)
+
+    if url is not None:
+        return url
+
     _path = file_root()
     ppl = f'{_path}/pp/EastMoney/Url_{pp}.txt'
-    f2 = open(ppl, 'r')
-    lines = f2.readlines()
-    url = lines[0]
+
+    with open(ppl, 'r') as f2:
+        url = f2.readline()
+
     url = url.strip('\n')
     url = url.replace(' ', '')
+    URLS[pp] = url
     return url
 
 
-def print_dl(freq, code):
-    print(f'Success Download {freq} Data: {code};')
-
-
-def return_FundsData(source, date_new):
-    columns = ['序号', 'stock_code', 'stock_name', '相关', '今日收盘价', '今日涨跌幅', '今日持股股数',
-               '今日持股市值', '今日持股占流通股比', '今日持股占总股本比', '今日增持股数',
-               '今日增持市值', '今日增持市值增幅', '今日增持占流通股比', '今日增持占总股本比', 'industry']
-
-    df = pd.read_html(source)[1]
-    df.columns = columns
-    df.loc[:, 'trade_date'] = pd.to_datetime(date_new)
-    df = df[['trade_date', 'stock_code', 'stock_name', 'industry']]
-    df['stock_code'] = df['stock_code'].astype(str)
-
-    return df
+def parse_dates(column, fmt: str):
+    # 指定格式解析并缓存重复值; 格式不符时退回自动识别
+    try:
+        dates = pd.to_datetime(column, format=fmt, cache=True)
 
+    except ValueError:
+        dates = pd.to_datetime(column, cache=True)
 
-def conversion(x):  # 货币单位转换函数  Unit conversion
+    return dates
 
-    if x == '亿':
-        values = 100000000
 
-    elif x == '万':
-        values = 10000
+def jsonp_body(source: str):
+    # JSONP: callback( json ); 首个 '(' 与末个 ')' 之间即为 json, 直接切片, 不经正则
+    start = source.find('(')
+    end = source.rfind(')')
 
-    elif x == '百万':
-        values = 1000000
+    if start < 0 or end <= start:
+        raise ValueError('非 JSONP 格式数据;')
 
-    elif x == '千万':
-        values = 10000000
+    return source[start + 1:end]
 
-    else:
-        values = 1
 
-    return values
+def position_shares(source):
+    # 基金页 持仓股票 表格; 页面不含持仓表时直接返回, 不构建整页解析树
+    if 'position_shares' not in source:
+        return pd.DataFrame()
 
+    if LexborHTMLParser is not None:
+        shares = LexborHTMLParser(source).css_first('li.position_shares')
 
-def FundsDataClean(data):
-    data = pd.DataFrame(data.values)
-    data = data[[1, 5, 6, 7, 9, 12]]
-    data = data.rename(columns={1: '板块', 5: 'NkPT市值', 6: 'NkPT占板块比',
-                                7: 'NkPT占北向资金比', 9: 'NRPT市值', 12: 'NRPT占北向资金比'})
+        if shares is None:
+            return pd.DataFrame()
 
-    data.loc[:, 'Unit_NKPT'] = data['NkPT市值'].str[-1:]
-    data.loc[:, 'NkPT市值'] = data['NkPT市值'].str[:-1].astype(float) * data.Unit_NKPT.apply(lambda x: conversion(x))
-    data.loc[:, 'Unit_NRPT'] = data['NRPT市值'].str[-1]
-    data.loc[:, 'NRPT市值'] = data['NRPT市值'].str[:-1].astype(float) * data.Unit_NRPT.apply(lambda x: conversion(x))
+        names = [i.text().translate(BLANKS) for i in shares.css('td.alignLeft')]
+        return pd.DataFrame({'stock_name': names})
 
-    data = data.drop(columns=['Unit_NKPT', 'Unit_NRPT'])
+    # 只解析持仓表所在的 li, 其余节点不生成对象
+    source = soup(source, 'lxml', parse_only=POSITION_SHARES)
+    shares = source.find_all('li', class_='position_shares')
 
-    return data
+    if not shares:
+        return pd.DataFrame()
 
+    names = [i.text.translate(BLANKS) for i in shares[0].find_all('td', class_='alignLeft')]
+    return pd.DataFrame({'stock_name': names})
 
-def get_1m_data(source, match=False, multiple=False):
-    # 最小匹配，保留括号内的Json 数据
-    if match:
-        p1 = re.compile(r'[(](.*?)[)]', re.S)
-        source = re.findall(p1, source)
-        source = json.loads(source[0])['data']['trends']
 
-    else:
-        source = json.loads(source)['data']['trends']
+def print_dl(freq, code):
+    logger.info('Success Download %s Data: %s;', freq, code)
 
-    source = [x.split(',') for x in source]
 
-    # 构建空的Dataframe 保留数据
-    columns = ['date', 'open', 'close', 'high', 'low', 'volume', 'money']
-    df = pd.DataFrame(source, columns=columns)
+def return_FundsData(source, date_new):
+    # 只解析第 2 个表格的数据行, 按列位置直接取 代码(1)、名称(2)、行业(15); 不为整页所有表格构建 DataFrame
+    tree = lxml_html.fromstring(source)
+    rows = tree.xpath('(//table)[2]//tr[td]')
+    rows = [[td.text_content().strip() for td in row.xpath('./td')] for row in rows]
+    rows = [row for row in rows if len(row) >= 16]
 
-    # 将日期数据类型更改为 datetime
-    df['date'] = pd.to_datetime(df['date'])
+    df = pd.DataFrame({'trade_date': pd.to_datetime(date_new),
+                       'stock_code': pd.Series([row[1] for row in rows], dtype=STRING_DTYPE),
+                       'stock_name': pd.Series([row[2] for row in rows], dtype=STRING_DTYPE),
+                       'industry': [row[15] for row in rows]})
 
-    # 将数据类型更改为 float
-    flt = ['open', 'close', 'high', 'low', 'volume', 'money']
-    df[flt] = df[flt].astype(float)
+    return df
 
-    # 将数据类型更改为 整数
-    df['volume'] = df['volume'] * 100
-    df[['volume', 'money']] = df[['volume', 'money']].astype('int64')
 
-    # 清理 09：30 时间数据，合并成09:31分数据
-    if multiple:
-        df['day'] = df['date'].dt.date
-        news = pd.DataFrame()
+def FundsDataClean(data):
+    data = pd.DataFrame(data.values)
+    data = data[[1, 5, 6, 7, 9, 12]]
+    data.columns = ['板块', 'NkPT市值', 'NkPT占板块比', 'NkPT占北向资金比', 'NRPT市值', 'NRPT占北向资金比']
 
-        for index in df.drop_duplicates(subset=['day']).index:
+    # 货币单位转换: 整列拆分数值与单位并映射倍数, 不逐个元素调用 Python 函数
+    for col in ['NkPT市值', 'NRPT市值']:
+        parts = data[col].astype(str).str.extract(MONEY_VALUE)
+        num = pd.to_numeric(parts[0], errors='coerce')
+        mult = parts[1].map(MONEY_UNITS).fillna(1).astype('float64')
+        data[col] = (num * mult).values
 
-            # 多个日期，按照日期来整理  09:30 & 09:31 数据
-            d1 = df.loc[index, 'day']
-            df2 = df[df['day'] == d1].reset_index(drop=True)
-            df2.loc[1, 'volume'] = df2.loc[0, 'volume'] + df2.loc[1, 'volume']
-            df2.loc[1, 'money'] = df2.loc[0, 'money'] + df2.loc[1, 'money']
-            df2 = df2.iloc[1:].reset_index(drop=True)
+    data['板块'] = data['板块'].astype('category')
+    return data
 
-            news = pd.concat([news, df2], ignore_index=True)
 
-        news = news[columns]
+def get_1m_data(source, match=False, multiple=False):
+    # 保留括号内的Json 数据
+    if match:
+        source = json_loads(jsonp_body(source))['data']['trends']
 
     else:
-        df.loc[1, 'volume'] = df.loc[0, 'volume'] + df.loc[1, 'volume']
-        df.loc[1, 'money'] = df.loc[0, 'money'] + df.loc[1, 'money']
+        source = json_loads(source)['data']['trends']
 
-        news = df.iloc[1:].reset_index(drop=True)
+    columns = ['date', 'open', 'close', 'high', 'low', 'volume', 'money']
 
+    if not source:  # 无分时数据
+        return pd.DataFrame(columns=columns)
+
+    # trends 每条为一行 csv, 交给 C 解析器一次完成拆分和数值转换; 只解析前 7 列, 行尾多出的字段 (如均价) 直接跳过
+    dtypes = {'date': str, 'open': np.float64, 'close': np.float64, 'high': np.float64, 'low': np.float64,
+              'volume': np.float64, 'money': np.float64}
+    df = pd.read_csv(io.StringIO('\n'.join(source)), header=None, names=columns, usecols=range(len(columns)),
+                     dtype=dtypes, engine='c')
+
+    # 按列取出 numpy 数组处理, 最后一次构建 DataFrame, 不再逐列回写、drop 及 reset_index
+    dates = parse_dates(df['date'], '%Y-%m-%d %H:%M').to_numpy()
+
+    # 将数据类型更改为 整数; 成交量单位 手 -> 股
+    volume = np.multiply(df['volume'].to_numpy(), 100).astype(np.int64)
+    money = df['money'].to_numpy().astype(np.int64)
+
+    # 清理 09：30 时间数据，合并成09:31分数据; 单日为多日的特例, multiple 仅为兼容调用保留
+    # 按分钟数定位每日 09:30 数据, 成交量/额并入下一行 09:31
+    stamp = dates.astype('datetime64[m]')
+    minute = (stamp - stamp.astype('datetime64[D]')).astype(np.int64)
+    first = np.flatnonzero(minute == 9 * 60 + 30)
+    merge = first[first + 1 < dates.shape[0]]
+
+    volume[merge + 1] += volume[merge]
+    money[merge + 1] += money[merge]
+
+    keep = np.ones(dates.shape[0], dtype=bool)
+    keep[first] = False
+
+    news = pd.DataFrame({'date': dates[keep],
+                         'open': df['open'].to_numpy()[keep],
+                         'close': df['close'].to_numpy()[keep],
+                         'high': df['high'].to_numpy()[keep],
+                         'low': df['low'].to_numpy()[keep],
+                         'volume': volume[keep],
+                         'money': money[keep]})
     return news
 
 
@@ -155,7 +263,7 @@ class DownloadData:  # 从东方财富下载数据
         codes = UrlCode(code)
         url = data_url('stock_1m_data').format(codes)
 
-        source = page_source(url=url, headers=headers)
+        source = cached_page_source(url=url, headers=headers, ttl=60)
         dl_ = get_1m_data(source=source, match=True, multiple=False)
 
         print_dl('1m', code)
@@ -168,7 +276,7 @@ class DownloadData:  # 从东方财富下载数据
         url = data_url('stock_1m_multiple_days')
         url = url.format(days, codes)  # 东方财富分时数据网址
 
-        source = page_source(url=url, headers=headers)
+        source = cached_page_source(url=url, headers=headers, ttl=60)
 
         dl = get_1m_data(source=source, match=True, multiple=True)  # 处理下载数据
 
@@ -179,7 +287,7 @@ class DownloadData:  # 从东方财富下载数据
     def board_1m_data(cls, code: str):
         headers = data_headers('board_1m_data')
         url = data_url('board_1m_data').format(code)
-        source = page_source(url=url, headers=headers)
+        source = cached_page_source(url=url, headers=headers, ttl=60)
         dl = get_1m_data(source, match=True, multiple=False)
         print_dl('1m', code)  # 打印下载
         return dl
@@ -188,44 +296,98 @@ class DownloadData:  # 从东方财富下载数据
     def board_1m_multiple(cls, code: str, days=5):
         headers = data_headers('board_1m_multiple_days')
         url = data_url('board_1m_multiple_days').format(code, days)
-        source = page_source(url=url, headers=headers)
+        source = cached_page_source(url=url, headers=headers, ttl=60)
         dl = get_1m_data(source, match=False, multiple=True)
         print_dl('1m', code)
         return dl
 
     @classmethod
-    def funds_to_stock(cls):  # 从东方财富网下载北向资金流入个股数据：
+    def funds_to_stock(cls, pages=3):  # 从东方财富网下载北向资金流入个股数据：
+        """
+        每页50条, 共 pages 页; 已配置接口网址时各页直接请求数据接口并发下载, 不再启动浏览器逐页点击;
+        未配置接口网址、请求失败或接口无数据时, 退回浏览器翻页; 解析异常照常抛出, 不以浏览器掩盖;
+        """
+        data = None
+
+        try:
+            headers = data_headers('funds_to_stock')
+            url = data_url('funds_to_stock')
+
+        except FileNotFoundError:
+            logger.warning('未配置北向资金个股接口 (%s/%s 及同目录请求头文件), 跳过接口, 使用浏览器翻页;',
+                           file_root(), FUNDS_TO_STOCK_URL)
+
+        else:
+            with ThreadPoolExecutor(max_workers=pages) as executor:
+                data = list(executor.map(lambda page: cls.funds_to_stock_page(url.format(page), headers),
+                                         range(1, pages + 1)))
+
+            if any(page is None for page in data):
+                logger.warning('北向资金个股接口请求失败或无数据, 改用浏览器翻页;')
+                data = None
+
+            else:
+                data = pd.concat(data, ignore_index=True)
+
+        if data is None:
+            data = cls.funds_to_stock_by_driver()
+
+        data['industry'] = data['industry'].astype('category')  # 行业重复度高, 以类别编码存储
+
+        logger.info('东方财富下载北向资金流入个股据成功: %s条;', data.shape[0])
+        return data
+
+    @classmethod
+    def funds_to_stock_page(cls, url, headers):
+        # 请求失败或接口无数据时返回 None
+        PageSource = page_source(url=url, headers=headers)
+
+        if not PageSource:
+            return None
+
+        # 网址模板带 callback 参数时为 JSONP, 否则为 json
+        body = PageSource if PageSource.lstrip().startswith('{') else jsonp_body(PageSource)
+        result = json_loads(body)['result']
+
+        if not result or not result['data']:  # 无数据时接口返回 result: null
+            return None
+
+        data = pd.DataFrame.from_records(result['data'], columns=list(FUNDS_TO_STOCK_COLUMNS))
+        data = data.rename(columns=FUNDS_TO_STOCK_COLUMNS)
+        data['trade_date'] = parse_dates(data['trade_date'], '%Y-%m-%d %H:%M:%S')
+        data = data.astype({'stock_code': STRING_DTYPE, 'stock_name': STRING_DTYPE})
+        return data
+
+    @classmethod
+    def funds_to_stock_by_driver(cls):
 
         # 下载北向资金每日流向数据，通过北向资金流入，选择自己的股票池; 北向资金已经下载数据； 北向资金个股流入个股网址
         page1 = 'http://data.eastmoney.com/hsgtcg/list.html'
         page2 = '/html/body/div[1]/div[8]/div[2]/div[2]/div[2]/div[3]/div[3]/div[1]/a[2]'
         page3 = '/html/body/div[1]/div[8]/div[2]/div[2]/div[2]/div[3]/div[3]/div[1]/a[4]'
         path_date = '/html/body/div[1]/div[8]/div[2]/div[2]/div[1]/div[1]/div/span'
-        driver = webdriver.Chrome()
-        driver.get(page1)
-        new_date = pd.to_datetime(driver.find_element_by_xpath(path_date).text[1:-1])
-
-        # 获取第1页50条数据
-        source01 = driver.page_source
-        dl01 = return_FundsData(source01, new_date)
-
-        # 获取第2页50条数据
-        driver.find_element_by_xpath(page2).click()
-        time.sleep(6)
-        source02 = driver.page_source
-        dl02 = return_FundsData(source02, new_date)
-
-        # 获取第3页50条数据
-        driver.find_element_by_xpath(page3).click()
-        time.sleep(6)
-        source03 = driver.page_source
-        dl03 = return_FundsData(source03, new_date)
-        driver.close()
+        # 解析已取回的页面, 同时浏览器继续翻页; 翻页结束即归还浏览器, 再等待解析完成
+        with ThreadPoolExecutor(max_workers=1) as executor, driver_pool.lease() as driver:
+            driver.get(page1)
+            new_date = pd.to_datetime(driver.find_element_by_xpath(path_date).text[1:-1])
+
+            # 获取第1页50条数据
+            dl01 = executor.submit(return_FundsData, driver.page_source, new_date)
+
+            # 获取第2页50条数据; 翻页后等待表格首行变化, 不再固定等待 6 秒
+            first_row = driver.execute_script(FIRST_ROW_JS)
+            driver.find_element_by_xpath(page2).click()
+            WebDriverWait(driver, 10).until(lambda d: d.execute_script(FIRST_ROW_JS) != first_row)
+            dl02 = executor.submit(return_FundsData, driver.page_source, new_date)
+
+            # 获取第3页50条数据
+            first_row = driver.execute_script(FIRST_ROW_JS)
+            driver.find_element_by_xpath(page3).click()
+            WebDriverWait(driver, 10).until(lambda d: d.execute_script(FIRST_ROW_JS) != first_row)
+            dl03 = executor.submit(return_FundsData, driver.page_source, new_date)
 
         # 合并数据：
-        data = pd.concat([dl01, dl02, dl03], ignore_index=True).reset_index(drop=True)
-
-        print(f'东方财富下载{new_date}日北向资金流入个股据成功;')
+        data = pd.concat([dl01.result(), dl02.result(), dl03.result()], ignore_index=True)
         return data
 
     @classmethod
@@ -235,106 +397,106 @@ class DownloadData:  # 从东方财富下载数据
 
         PageSource = page_source(url=url, headers=headers)
 
-        p1 = re.compile(r'[(](.*?)[)]', re.S)  # 最小匹配
-        dl = re.findall(p1, PageSource)[0]
-        dl = pd.DataFrame(data=json.loads(dl)['result']['data'])
+        dl = jsonp_body(PageSource)
+        dl = pd.DataFrame(data=json_loads(dl)['result']['data'])
         dl = dl[['TRADE_DATE', 'NET_INFLOW_SH', 'NET_INFLOW_SZ', 'NET_INFLOW_BOTH']]
-        dl.loc[:, 'TRADE_DATE'] = pd.to_datetime(dl['TRADE_DATE']).dt.date
-        dl = dl.rename(columns={'TRADE_DATE': 'trade_date'})
-        print('东方财富下载近一个月北向资金数据成功;')
+        dl.columns = ['trade_date', 'NET_INFLOW_SH', 'NET_INFLOW_SZ', 'NET_INFLOW_BOTH']
+        dl.loc[:, 'trade_date'] = parse_dates(dl['trade_date'], '%Y-%m-%d %H:%M:%S').dt.date
+        logger.info('东方财富下载近一个月北向资金数据成功;')
         return dl
 
     @classmethod
     def funds_daily_data(cls):
         web_01 = 'https://data.eastmoney.com/hsgt/'
-        driver = webdriver.Chrome()
-        driver.set_page_load_timeout(60)
-        driver.set_script_timeout(60)
-        driver.get(web_01)
+        with driver_pool.lease() as driver:
+            driver.set_page_load_timeout(60)
+            driver.set_script_timeout(60)
+            driver.get(web_01)
 
-        # 更新时间 07-30
-        update_xpath = '/html/body/div[1]/div[8]/div[2]/div[2]/div[3]/div[1]/div[3]/span'
+            # 更新时间 07-30
+            update_xpath = '/html/body/div[1]/div[8]/div[2]/div[2]/div[3]/div[1]/div[3]/span'
 
-        # 沪股通 净流入
-        SH_money_xpath = '/html/body/div[1]/div[8]/div[2]/div[2]/div[3]/div[6]/ul[1]/li[1]/span[2]/span/span'
+            # 沪股通 净流入
+            SH_money_xpath = '/html/body/div[1]/div[8]/div[2]/div[2]/div[3]/div[6]/ul[1]/li[1]/span[2]/span/span'
 
-        # 深股通 净流入
-        SZ_money_xpath = '/html/body/div[1]/div[8]/div[2]/div[2]/div[3]/div[6]/ul[1]/li[2]/span[2]/span/span'
+            # 深股通 净流入
+            SZ_money_xpath = '/html/body/div[1]/div[8]/div[2]/div[2]/div[3]/div[6]/ul[1]/li[2]/span[2]/span/span'
 
-        # 北向 净流入
-        North_sum_xpath = '/html/body/div[1]/div[8]/div[2]/div[2]/div[3]/div[6]/ul[1]/li[3]/span[2]/span/span'
+            # 北向 净流入
+            North_sum_xpath = '/html/body/div[1]/div[8]/div[2]/div[2]/div[3]/div[6]/ul[1]/li[3]/span[2]/span/span'
 
-        update = driver.find_element_by_xpath(update_xpath).text
-        SH_money = float(driver.find_element_by_xpath(SH_money_xpath).text[:-2]) * 100
-        SZ_money = float(driver.find_element_by_xpath(SZ_money_xpath).text[:-2]) * 100
-        North_sum = float(driver.find_element_by_xpath(North_sum_xpath).text[:-2]) * 100
+            # 四个节点一次 JS 调用取回, 不再逐个 find_element 往返浏览器
+            xpaths = [update_xpath, SH_money_xpath, SZ_money_xpath, North_sum_xpath]
+            texts = driver.execute_script(XPATH_TEXTS_JS, xpaths)
+
+        update = texts[0]
+        SH_money = float(texts[1][:-2]) * 100
+        SZ_money = float(texts[2][:-2]) * 100
+        North_sum = float(texts[3][:-2]) * 100
 
         data_dic = {'trade_date': [pd.to_datetime(update)], 'NET_INFLOW_SH': [SH_money],
                     'NET_INFLOW_SZ': [SZ_money], 'NET_INFLOW_BOTH': [North_sum]}
 
         data = pd.DataFrame(data=data_dic)
-        driver.close()
-        print(f'东方财富下载{update}日北向资金成功;')
+        logger.info('东方财富下载%s日北向资金成功;', update)
         return data
 
     @classmethod
     def funds_to_sectors(cls, date_: str):
         headers = data_headers('funds_to_sectors')
         url = data_url('funds_to_sectors').format(date_)
-        PageSource = page_source(url=url, headers=headers)
+
+        # 已收盘日期的数据不再变化, 缓存 30 天; 当日数据缓存 60 秒
+        ttl = 60 if pd.Timestamp(date_).date() >= pd.Timestamp('today').date() else 30 * 24 * 3600
+        PageSource = cached_page_source(url=url, headers=headers, ttl=ttl)
 
         try:
-            p1 = re.compile(r'[(](.*?)[)]', re.S)
-            page_data = re.findall(p1, PageSource)
-            json_data = json.loads(page_data[0])
+            page_data = jsonp_body(PageSource)
+            json_data = json_loads(page_data)
             json_data = json_data['result']['data']
 
-            value_list = []
-            for i in range(len(json_data)):
-                values = list(json_data[i].values())
-                value_list.append(values)
-
-            key_list = list(json_data[0])
-
-            download = pd.DataFrame(data=value_list, columns=key_list)
-
             drops = ['BOARD_INNER_CODE', 'BOARD_TYPE', 'MINADD_RATIO_SECUCODE',
                      'IS_NEW', 'INTERVAL_TYPE', 'COMPOSITION_QUANTITY_ADD',
                      'MAXADD_RATIO_SECUCODE', 'MINADD_SECUCODE',
                      'ORIG_BOARD_CODE', 'MAXADD_SECUCODE', 'MAXHOLD_MARKETCAP_NAME',
                      'MAXHOLD_MARKETCAP_SECURITYCODE', 'MAXHOLD_MARKETCAP_SECUCODE']
 
-            download = download.drop(columns=drops)
+            # 构建时即排除不需要的列, 不再先建整表再 drop 复制一次
+            download = pd.DataFrame.from_records(json_data, exclude=drops)
 
-            download.loc[:, 'TRADE_DATE'] = pd.to_datetime(download['TRADE_DATE']).dt.date
+            download.loc[:, 'TRADE_DATE'] = parse_dates(download['TRADE_DATE'], '%Y-%m-%d %H:%M:%S').dt.date
 
-        except TypeError:
-            print(f'东方财富下载 Funds to Sectors 数据异常;')
+        except (AttributeError, TypeError, ValueError):  # 无响应、无数据 或 非 JSONP 格式
+            logger.error('东方财富下载 Funds to Sectors 数据异常;')
             download = pd.DataFrame(data=None)
 
         return download
 
+    @classmethod
+    def funds_to_sectors_many(cls, dates: list, workers=4):
+        """
+        dates: ['2022-08-01', ...];
+        多日期并发下载, 共用 http 连接池; 请求频率由 download_utils 令牌桶统一限制;
+        return: {date: data}
+        """
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(cls.funds_to_sectors, dates)
+            results = dict(zip(dates, results))
+
+        return results
+
     @classmethod
     def industry_list(cls):  # 下载板块组成
         web = 'http://quote.eastmoney.com/center/boardlist.html#industry_board'
-        driver = webdriver.Chrome()
-        driver.get(web)
-
-        source = driver.page_source
-        bs_data = soup(source, 'html.parser')
-        board_data = bs_data.find('li', class_='sub-items menu-industry_board-wrapper')
-        board_data = board_data.find_all('li')
-        data = pd.DataFrame(data=None)
-
-        for i in range(len(board_data)):
-            board_name = board_data[i].find(class_='text').text
-            board_code = str(board_data[i].find('a')['href']).strip()[-6:]
-            data.loc[i, 'board_name'] = board_name
-            data.loc[i, 'board_code'] = board_code
-
-        driver.close()
-        data.loc[:, 'stock_name'] = None
-        data.loc[:, 'stock_code'] = None
+        with driver_pool.lease() as driver:
+            driver.get(web)
+            # 板块名称及代码在浏览器内一次取回, 不再取整页源码解析
+            board_data = driver.execute_script(INDUSTRY_BOARDS_JS)
+
+        # 取回的 [名称, 代码] 行一次构建 DataFrame, 不再逐行 .loc 扩充
+        data = pd.DataFrame(data=board_data, columns=['board_name', 'board_code'])
+        data['stock_name'] = None
+        data['stock_code'] = None
         return data
 
     @classmethod
@@ -345,30 +507,20 @@ class DownloadData:  # 从东方财富下载数据
 
         dl = None
         if source:
-            p1 = re.compile(r'[(](.*?)[)]', re.S)
-            page_data = re.findall(p1, source)
-            json_data = json.loads(page_data[0])['data']['diff']
-
-            values_list = []
-            for i in range(len(json_data)):
-                values = list(json_data[i].values())
-                values_list.append(values)
-
-            key_list = list(json_data[0])
-            dl = pd.DataFrame(data=values_list, columns=key_list)
-            dl = dl.rename(columns={
-                'f3': '涨跌幅', 'f4': '涨跌额', 'f5': '成交量', 'f6': '成交额', 'f7': '振幅', 'f8': '换手率',
-                'f9': '市盈率动', 'f10': '量比', 'f12': 'stock_code', 'f14': 'stock_name', 'f15': 'close',
-                'f16': 'low', 'f17': 'open', 'f18': 'preclose', 'f20': '总市值', 'f21': '流通市值', 'f23': '市净率',
-                'f115': '市盈率'})
-
-            dl = dl.drop(columns=['f1', 'f2', 'f11', 'f13', 'f22', 'f24', 'f25', 'f45',
-                                  'f62', 'f128', 'f140', 'f141', 'f136', 'f152'])
-            dl.loc[:, 'board_name'] = name
-            dl.loc[:, 'board_code'] = code
-            dl.loc[:, 'date'] = pd.Timestamp('today').date()
-
-            dl = dl[['board_name', 'board_code', 'stock_code', 'stock_name', 'date']]
+            page_data = jsonp_body(source)
+            json_data = json_loads(page_data)['data']['diff']
+
+            # 只取 代码(f12)、名称(f14) 两列, 其余字段不重命名、不 drop, 直接投影丢弃
+            dl = pd.DataFrame.from_records(json_data, columns=['f12', 'f14'])
+            dl = dl.rename(columns={'f12': 'stock_code', 'f14': 'stock_name'})
+
+            dl.insert(0, 'board_name', name)
+            dl.insert(1, 'board_code', code)
+            dl['date'] = pd.Timestamp('today').date()
+
+            # 板块名称、代码整列相同, 以类别编码存储; 股票代码、名称同 return_FundsData 使用字符串类型
+            dl = dl.astype({'board_name': 'category', 'board_code': 'category',
+                            'stock_code': STRING_DTYPE, 'stock_name': STRING_DTYPE})
 
         return dl
 
@@ -376,48 +528,110 @@ class DownloadData:  # 从东方财富下载数据
     def funds_awkward(cls, code):
         url = data_url('funds_awkward').format(code)
         headers = data_headers('funds_awkward')
-        source = page_source(url=url, headers=headers)
-        source = soup(source, 'lxml')
-        source = source.find("tbody")
-        stocks = source.find_all("tr")
-        li_name = []
-        li_code = []
-        for i in stocks:
-            name = i.find(class_="tol").text.replace(' ', '')
-            code = i.find_all('td')[1].text.replace(' ', '')
-            li_name.append(name)
-            li_code.append(code)
-        dic = {'stock_name': li_name, 'stock_code': li_code}
-        data = pd.DataFrame(dic)
+
+        # 基金持仓按季度更新: 缓存一天, 过期后先用旧数据, 后台刷新
+        source = cached_page_source(url=url, headers=headers, ttl=24 * 3600, stale=True)
+
+        # 只取第一个 tbody 的数据行, 名称(class=tol)、代码(第 2 列); 代码以一次正则匹配取出并校验, 无股票代码的行跳过
+        rows = lxml_html.fromstring(source).xpath('(//tbody)[1]/tr')
+        names = []
+        codes = []
+
+        for row in rows:
+            cells = row.findall('.//td')
+            match = STOCK_CODE.search(cells[1].text_content()) if len(cells) > 1 else None
+
+            if match is None:
+                continue
+
+            names.append(row.find_class('tol')[0].text_content().translate(BLANKS))
+            codes.append(match.group())
+
+        data = pd.DataFrame({'stock_name': names, 'stock_code': codes})
         return data
 
     @classmethod
-    def funds_awkward_by_driver(cls, code):
+    def funds_awkward_page(cls, code):
+        """
+        基金页持仓表由服务端直接输出, 用 http 请求获取, 无需启动浏览器;
+        依次换用请求头重试, 网络异常由 get_response 退避重试; 全部失败或被拒绝访问时返回空表;
+        """
+        url = f'http://fund.eastmoney.com/{code}.html'
+
+        for headers in BROWSER_HEADER_SETS:
+            response = get_response(url, headers=headers)
+
+            if response is None:
+                continue
+
+            source = response_text(response)
+
+            # 拒绝访问页很短, 只查看响应开头, 不扫描整个页面
+            if response.status_code == 403 or 'Access Denied' in source[:512]:
+                break
+
+            data = position_shares(source)
+
+            if data.shape[0]:
+                return data
+
+        return pd.DataFrame()
+
+    @classmethod
+    def funds_awkward_by_driver(cls, code, force_browser=False):
+        """
+        先用 http 请求获取基金页持仓 (funds_awkward_page);
+        获取失败 或 force_browser=True 时, 再用浏览器获取;
+        """
+        if not force_browser:
+            data = cls.funds_awkward_page(code)
+
+            if data.shape[0]:
+                return data
+
+        url = f'http://fund.eastmoney.com/{code}.html'
 
         try:
-            url = f'http://fund.eastmoney.com/{code}.html'
-            driver = WebDriver()
-            driver.get(url)
-            source = driver.page_source
-            source = soup(source, 'html.parser')
-            source = source.find_all('li', class_='position_shares')[0].find_all('td', class_='alignLeft')
-            driver.close()
-
-            li = []
-            for i in source:
-                name = i.text.replace(' ', '')
-                li.append(name)
-
-            dic = {'stock_name': li}
-            data = pd.DataFrame(dic)
+            with driver_pool.lease() as driver:
+                driver.get(url)
+                source = driver.page_source
+
+            data = position_shares(source)
 
         except ValueError:
             data = pd.DataFrame()
 
         return data
 
+    @classmethod
+    def funds_awkward_any(cls, code):
+        """
+        持仓接口 (funds_awkward) 与基金页 (funds_awkward_page) 同时请求, 取先返回的非空结果;
+        两者均失败时才启动浏览器;
+        """
+        executor = ThreadPoolExecutor(max_workers=2)
+        futures = [executor.submit(cls.funds_awkward, code), executor.submit(cls.funds_awkward_page, code)]
+
+        try:
+            for future in as_completed(futures):
+                try:
+                    data = future.result()
+
+                except Exception as ex:
+                    logger.warning('基金%s持仓下载异常: %s', code, ex)
+                    continue
+
+                if data.shape[0]:
+                    return data
+
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return cls.funds_awkward_by_driver(code, force_browser=True)
+
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     # data = DownloadData.stock_1m_multiple(code='002475')
     dl = DownloadData()
     data = dl.stock_1m_multiple('002475')
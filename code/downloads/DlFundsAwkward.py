@@ -1,10 +1,13 @@
+import logging
 import multiprocessing
-import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from code.MySql.LoadMysql import LoadFundsAwkward as aw
 from code.MySql.LoadMysql import StockPoolData as pl
 from DlEastMoney import DownloadData as dle
 
+logger = logging.getLogger(__name__)
+
 
 class DownloadFundsAwkward:
     """
@@ -38,47 +41,47 @@ class DownloadFundsAwkward:
         pending = record[(record['Date'] == self.DlDate) & (record['Status'] != 'success')].reset_index(drop=True)
         return pending
 
-    def awkward_top10(self, start: int, end: int):
-
-        num = 0
-        for index in range(start, end):
-            funds_name = self.pending.loc[index, 'Name']
-            funds_code = self.pending.loc[index, 'Code']
-            id_ = self.pending.loc[index, 'id']
-            select = self.pending.loc[index, 'Selection']
+    def awkward_top10(self, start: int, end: int, workers=8):
+        """
+        多线程并发下载基金持仓, 请求频率由 download_utils 令牌桶统一限制, 不再每只基金固定等待;
+        数据库写入仍在当前线程按顺序进行;
+        """
+        indexes = list(range(start, end))
+        codes = [self.pending.loc[index, 'Code'] for index in indexes]
 
-            print(f'回测进度：\n总股票数:{end - start}个; 剩余股票: {end - start - num}个;\n当前股票：{funds_name},{funds_code};')
-            try:
-                data = dle.funds_awkward(funds_code)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            downloads = executor.map(dle.funds_awkward_any, codes)
 
-            except Exception as ex:
-                print(f'Dl EastMoney funds_awkward error: {ex}')
-                data = dle.funds_awkward_by_driver(funds_code)
+            for num, (index, data) in enumerate(zip(indexes, downloads)):
+                funds_name = self.pending.loc[index, 'Name']
+                funds_code = self.pending.loc[index, 'Code']
+                id_ = self.pending.loc[index, 'id']
+                select = self.pending.loc[index, 'Selection']
 
-            if data.shape[0]:
-                data.loc[:, 'funds_name'] = funds_name
-                data.loc[:, 'funds_code'] = funds_code
-                data.loc[:, 'Date'] = self.DlDate
-                data.loc[:, 'Selection'] = select
+                logger.debug('下载进度: 总基金数:%s个; 剩余基金: %s个; 当前基金：%s,%s;',
+                             end - start, end - start - num, funds_name, funds_code)
 
-                data = data[['stock_name', 'funds_name', 'funds_code', 'Date', 'Selection']]
-                aw.append_fundsAwkward(data)
+                if data.shape[0]:
+                    data.loc[:, 'funds_name'] = funds_name
+                    data.loc[:, 'funds_code'] = funds_code
+                    data.loc[:, 'Date'] = self.DlDate
+                    data.loc[:, 'Selection'] = select
 
-                sql = f'''update {aw.db_funds_awkward}.{aw.tb_funds_500} set Status = 'success' where id = '{id_}';'''
-                print(f'{funds_name} data download success;\n')
+                    data = data[['stock_name', 'funds_name', 'funds_code', 'Date', 'Selection']]
+                    aw.append_fundsAwkward(data)
 
-            else:
-                sql = f'''update {aw.db_funds_awkward}.{aw.tb_funds_500} set Status = 'failed' where id = '{id_}';'''
-                print(f'{funds_name} data download failed;\n')
+                    sql = f'''update {aw.db_funds_awkward}.{aw.tb_funds_500} set Status = 'success' where id = '{id_}';'''
+                    logger.info('%s data download success;', funds_name)
 
-            aw.awkward_execute_sql(sql=sql)
+                else:
+                    sql = f'''update {aw.db_funds_awkward}.{aw.tb_funds_500} set Status = 'failed' where id = '{id_}';'''
+                    logger.warning('%s data download failed;', funds_name)
 
-            num += 1
-            time.sleep(5)
+                aw.awkward_execute_sql(sql=sql)
 
     def multi_processing(self):
         self.pending = self.pending_data()
-        print(self.pending.tail())
+        logger.debug('待下载基金:\n%s', self.pending)  # 仅 DEBUG 级别才渲染表格
         indexes = self.pending.shape[0]
         if indexes:
 
@@ -147,11 +150,11 @@ class AnalysisFundsAwkward:
             pl.pool_execute_sql(sql)
             self.count_dic[stock_name] = score
 
-        print(f'Success count: {self.count_dic}')
+        logger.info('Success count: %s', self.count_dic)
 
     def normalization_last(self):
         awkward = self.awkward[self.awkward['Date'] == self.DlDate]
-        print(self.pool.head())
+        logger.debug('%s', self.pool.head())
 
         if awkward.shape[0]:
             for index in self.pool.index:
@@ -179,10 +182,11 @@ class AnalysisFundsAwkward:
                 pl.pool_execute_sql(sql)
                 self.count_dic[stock_name] = score
 
-            print(f'Success count: {self.count_dic}')
+            logger.info('Success count: %s', self.count_dic)
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     DlDate = '2022-04-09'
     aly = AnalysisFundsAwkward(dl_date=DlDate)
     aly.normalization_last()
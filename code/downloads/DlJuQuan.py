@@ -4,20 +4,22 @@
 # auth('13975124715', '651748264Zz')
 
 import pandas as pd
+from download_utils import TokenBucket
 
+JQ_MARKETS = {'6': 'XSHG', '0': 'XSHE', '3': 'XSHE'}  # 代码首位 -> 聚宽市场后缀
 
-def JQ_code(code):
+# 聚宽接口限流: 两次请求至少间隔 10 秒; 距上次请求已超过间隔时不再等待
+JQ_BUCKET = TokenBucket('joinquant', capacity=1, rate=0.1)
 
-    if code[0] == '6':
-        code = f'{code}.XSHG'
 
-    elif code[0] == '0' or code[0] == '3':
-        code = f'{code}.XSHE'
+def JQ_code(code):
+    market = JQ_MARKETS.get(code[0])
 
-    else:
+    if market is None:
         print(f'股票:{code}JQ无市场分类；')
+        return code
 
-    return code
+    return f'{code}.{market}'
 
 
 def fuquan_value(fq):
@@ -39,17 +41,17 @@ class DownloadData:
     def download_history_data(cls, code, start_date, end_date, frequency, fq_value):
         code = JQ_code(code)
         fq = fuquan_value(fq_value)
+        JQ_BUCKET.acquire()
         download = get_price(code, start_date=start_date, end_date=end_date, frequency=frequency, fq=fq)
         if len(download):
-            download = download.reset_index()
-            download = download.rename(columns={'index': 'date'})
-            # 标准化数据
-            download.loc[:, 'date'] = pd.to_datetime(download['date'])
-            float_column = ['open', 'close', 'high', 'low', 'volume', 'money']
-            download[float_column] = download[float_column].astype(float)
-            download[['volume', 'money']] = download[['volume', 'money']].astype('int64')
-            st_col = ['date', 'open', 'close', 'high', 'low', 'volume', 'money']
-            download = download[st_col]
+            # 标准化数据: 按列一次构建结果, 不经过 reset_index / rename / astype 的中间拷贝
+            download = pd.DataFrame({'date': pd.to_datetime(download.index),
+                                     'open': download['open'].to_numpy(dtype='float64'),
+                                     'close': download['close'].to_numpy(dtype='float64'),
+                                     'high': download['high'].to_numpy(dtype='float64'),
+                                     'low': download['low'].to_numpy(dtype='float64'),
+                                     'volume': download['volume'].to_numpy(dtype='float64').astype('int64'),
+                                     'money': download['money'].to_numpy(dtype='float64').astype('int64')})
         return download
 
     @classmethod
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from selenium import webdriver
+from download_utils import driver_pool
 import pandas as pd
 
 pd.set_option('display.max_columns', None)
@@ -11,11 +11,11 @@ class DownloadData:  # 新浪财经下载数据
     @classmethod
     def Pe(cls, mk, stock_code):
         web = f'https://finance.sina.com.cn/realstock/company/{mk}{stock_code}/nc.shtml'
-        driver = webdriver.Chrome()
-        driver.get(web)
-        pe = driver.find_element_by_xpath('/html/body/div[7]/div[3]/div[1]/div[1]'
-                                          '/div[2]/div[2]/table/tbody/tr[4]/td[3]').text
-        driver.close()
+        with driver_pool.lease() as driver:
+            driver.get(web)
+            pe = driver.find_element_by_xpath('/html/body/div[7]/div[3]/div[1]/div[1]'
+                                              '/div[2]/div[2]/table/tbody/tr[4]/td[3]').text
+
         return pe
 
 
@@ -1,3 +1,6 @@
+import datetime
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from DlEastMoney import DownloadData as dle
 import pandas as pd
 from code.MySql.LoadMysql import StockData1m, LoadBasicInform, LoadNortFunds
@@ -6,15 +9,27 @@ from DlDataCombine import download_full_north_funds_to_board
 pd.set_option('display.max_columns', None)
 pd.set_option('display.width', 5000)
 
+logger = logging.getLogger(__name__)
+
+# 每日更新时间窗口: 开盘前只更新北向资金, 收盘后更新1m数据; 模块加载时构建一次, 不再每次调用解析字符串
+OPEN_TIME = datetime.time(9, 30)
+CLOSE_TIME = datetime.time(15, 30)
+
+RECORD_BATCH = 50  # 1m 记录表每批更新的股票数
+
 
 def stock_1m(code, days):
 
     try:
         data = dle.stock_1m_multiple(code, days=days)
+
+        if data.empty:  # 空数据直接返回, 不再经由 iloc 抛出异常
+            return data, None
+
         date_ = data.iloc[-1]['date'].date()
 
     except Exception as ex:
-        print(f'从东方财富下载{code}异常：{ex};')
+        logger.error('从东方财富下载%s异常：%s;', code, ex)
         data = pd.DataFrame(data=None)
         date_ = None
 
@@ -24,161 +39,233 @@ def stock_1m(code, days):
 def board_1m(code, days):
     try:
         data = dle.board_1m_multiple(code, days=days)
+
+        if data.empty:  # 空数据直接返回, 不再经由 iloc 抛出异常
+            return data, None
+
         date_ = data.iloc[-1]['date'].date()
 
     except Exception as ex:
-        print(f'从东方财富下载{code}异常：{ex};')
+        logger.error('从东方财富下载%s异常：%s;', code, ex)
         data = pd.DataFrame(data=None)
         date_ = None
 
     return data, date_  # date_:  data  end date;
 
 
+def download_1m_batch(tasks: dict, workers=16):
+    """
+    tasks: {key: (download_fun, code, days)}, download_fun 为 stock_1m 或 board_1m;
+    下载以等待网络为主, 多线程并发; 请求频率及同一站点的在途请求数由 download_utils 限制,
+    线程数多于在途请求上限, 部分线程解析数据时其余线程仍在下载;
+    return: {key: (data, date_)}
+    """
+    keys = list(tasks)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(lambda key: tasks[key][0](tasks[key][1], tasks[key][2]), keys)
+        results = dict(zip(keys, results))
+
+    return results
+
+
 class DataDailyRenew:  # 近期数据更新
 
     @classmethod
-    def download_1mData(cls):
-        shapes = 1
+    def download_1mData(cls, retries=3):
+        """
+        记录表只读取一次; 之后每轮只重新下载上一轮下载失败的股票, 最多 retries 轮, 不再每轮重新查询整张记录表;
+        """
+        record = LoadBasicInform.load_minute()
+        industry_records = record[(record['Classification'] == '行业板块') &
+                                  (record['EndDate'] < pd.Timestamp('today'))]
+
+        stock_records = record[(record['Classification'] != '行业板块') &
+                               (record['StartDate'] < pd.to_datetime('2020-01-01')) &
+                               (record['EndDate'] < pd.Timestamp('today'))]
+
+        dl = pd.concat([industry_records, stock_records],
+                       ignore_index=True).sort_values(by=['EndDate']).reset_index(drop=True)
+        logger.debug('待更新1m数据:\n%s', dl)  # 仅 DEBUG 级别才渲染整张表
+
+        if not dl.shape[0]:
+            logger.info('已是最新数据')
+            return
+
+        current = pd.Timestamp('today').date()
+
+        # 下载天数及数据起点整列计算一次, 循环内不再逐行做日期运算
+        ending_dates = pd.to_datetime(dl['EndDate'])
+        dl['days'] = (pd.Timestamp(current) - ending_dates).dt.days.clip(upper=5)
+        dl['select'] = ending_dates + pd.Timedelta(days=1)
+
+        while dl.shape[0] and retries:
+            retries -= 1
+            shapes = dl.shape[0]
 
-        while shapes:
-            record = LoadBasicInform.load_minute()
-            industry_records = record[(record['Classification'] == '行业板块') &
-                                      (record['EndDate'] < pd.Timestamp('today'))]
+            """ 并发下载数据"""
+            tasks = {}
 
-            stock_records = record[(record['Classification'] != '行业板块') &
-                                   (record['StartDate'] < pd.to_datetime('2020-01-01')) &
-                                   (record['EndDate'] < pd.Timestamp('today'))]
+            # 逐行读取记录用 itertuples, 不再每个字段一次 .loc 查找
+            for rec in dl.itertuples():
+                _ending = rec.EndDate
 
-            dl = pd.concat([industry_records, stock_records],
-                           ignore_index=True).sort_values(by=['EndDate']).reset_index(drop=True)
-            print(dl)
-            shapes = dl.shape[0]
+                if current == _ending:
+                    continue
 
-            if not shapes:
-                print('已是最新数据')
-                break
+                if rec.Classification == '行业板块':  # 下载板块1m数据
+                    tasks[rec.Index] = (board_1m, rec.EsCode, rec.days)
 
-            for i in dl.index:
-                id_ = dl.loc[i, 'id']
-                name = dl.loc[i, 'name']
-                EsCode = dl.loc[i, 'EsCode']
-                code_ = dl.loc[i, 'code']
-                classification = dl.loc[i, 'Classification']
+                else:
+                    tasks[rec.Index] = (stock_1m, rec.EsCode, rec.days)
 
-                _ending = dl.loc[i, 'EndDate']
-                # ending = None  # 下载数据的日期
+            downloads = download_1m_batch(tasks)
+            updates = {}  # set 子句 -> [id, ...], 每 RECORD_BATCH 只股票及本轮结束 (含异常退出) 时批量更新记录表
 
-                current = pd.Timestamp('today').date()
+            failed = []  # 下载失败, 下一轮重试
 
-                days = (current - _ending).days
-                # days = days.days
-                days = min(5, days)
+            try:
+                for num, rec in enumerate(dl.itertuples()):
+                    # 已保存的数据按批写入记录表; 本轮中途异常时, 已保存部分也已记录, 下次不会重复追加
+                    if updates and num % RECORD_BATCH == 0:
+                        cls.update_minute_records(updates)
+                        updates.clear()
 
-                print(f'\n下载进度：\n总股票数: {dl.shape[0]}个; 剩余股票: {dl.shape[0] - i}个;')
+                    i = rec.Index
+                    id_ = rec.id
+                    name = rec.name
+                    code_ = rec.code
+                    classification = rec.Classification
 
-                if current == _ending:
-                    print(f'无最新1m数据:{name}, {code_};')
-                    continue
+                    _ending = rec.EndDate
+                    # ending = None  # 下载数据的日期
 
-                """ 下载数据"""
-                if classification == '行业板块':  # 下载个股1m数据
-                    data, ending = board_1m(EsCode, days)
+                    logger.debug('下载进度: 总股票数: %s个; 剩余股票: %s个;', shapes, shapes - num)
 
-                    if data.shape[0]:
-                        data['money'] = 0
+                    if current == _ending:
+                        logger.debug('无最新1m数据:%s, %s;', name, code_)
+                        continue
 
-                else:
-                    data, ending = stock_1m(EsCode, days)
+                    data, ending = downloads[i]
+
+                    ''' 判断下载数据是否为空，筛选后数据是否为空'''
+                    if ending is None:  # 下载失败或无数据
+                        failed.append(i)
+                        continue
+
+                    if classification == '行业板块':
+                        data['money'] = 0
 
-                ''' 判断下载数据是否为空，筛选后数据是否为空'''
-                try:
-                    select = pd.to_datetime(_ending + pd.Timedelta(days=1))
-                    data = data[data['date'] > select]
+                    # 下载数据按时间升序, 二分查找起点切片, 不逐行比较生成布尔掩码
+                    data = data.iloc[data['date'].searchsorted(rec.select, side='right'):]
 
                     if not data.shape[0]:
                         continue
 
-                except KeyError:
-                    continue
+                    """ 判断是否保存数据 及 更新记录表格 """
+                    if ending > _ending:
 
-                """ 判断是否保存数据 及 更新记录表格 """
-                if ending > _ending:
+                        try:  # 有时保存数据会出现未知错误
+                            # 保存数据， 保存 1m数据;
+                            year_ = ending.year
+                            StockData1m.append_1m(code_=code_, year_=str(year_), data=data)
 
-                    try:  # 有时保存数据会出现未知错误
-                        # 保存数据， 保存 1m数据;
-                        year_ = ending.year
-                        StockData1m.append_1m(code_=code_, year_=str(year_), data=data)
+                            updates.setdefault(f"EndDate='{ending}', RecordDate = '{current}', "
+                                               f"EsDownload = 'success'", []).append(id_)
 
-                        sql = f'''update {LoadBasicInform.db_basic}.{LoadBasicInform.tb_minute} 
-                        set EndDate='{ending}', RecordDate = '{current}', 
-                        EsDownload = 'success' where id={id_}; '''
-                        LoadBasicInform.basic_execute_sql(sql)
+                        except Exception as ex:
+                            updates.setdefault(f"RecordDate = '{current}', EsDownload = 'failed'", []).append(id_)
+                            logger.error('股票：%s, %s存储数据异常: %s', name, code_, ex)
 
-                    except Exception as ex:
-                        sql = f'''update {LoadBasicInform.db_basic}.{LoadBasicInform.tb_minute} 
-                        set RecordDate = '{current}', EsDownload = 'failed' where id={id_}; '''
-                        LoadBasicInform.basic_execute_sql(sql)
-                        print(f'股票：{name}, {code_}存储数据异常: {ex}')
+                        continue
 
-                    continue
+                    if ending == _ending:
+                        # 更新数据, record_stock_minute_data;
+                        updates.setdefault(f"EndDate = '{ending}', RecordDate = '{current}'", []).append(id_)
 
-                if ending == _ending:
-                    # 更新数据, record_stock_minute_data;
-                    sql = f'''update {LoadBasicInform.db_basic}.{LoadBasicInform.tb_minute} set 
-                    EndDate = '{ending}', RecordDate = '{current}' where id = {id_}; '''
-                    LoadBasicInform.basic_execute_sql(sql)
+                        logger.info('%s 数据更新成功: %s, %s', LoadBasicInform.tb_minute, name, code_)
+                        continue
 
-                    print(f'{LoadBasicInform.tb_minute} 数据更新成功: {name}, {code_}')
-                    continue
+            finally:
+                cls.update_minute_records(updates)
+
+            dl = dl.loc[failed]
+
+    @classmethod
+    def update_minute_records(cls, updates: dict):
+        """
+        updates: {set 子句: [id, ...]};
+        更新内容相同的记录合并为一条 update ... where id in (...), 不再每只股票执行一次 sql;
+        """
+        for values, ids in updates.items():
+            ids = ', '.join(str(id_) for id_ in ids)
+            sql = f'''update {LoadBasicInform.db_basic}.{LoadBasicInform.tb_minute} 
+            set {values} where id in ({ids}); '''
+            LoadBasicInform.basic_execute_sql(sql)
 
     @classmethod
     def renew_NorthFunds(cls):
         tables = ['tostock', 'amount', 'toboard']
         record = LoadBasicInform.load_record_north_funds()
-        # print(record)
-        # exit()
+        current = pd.Timestamp('today').date()
+
+        # 三类数据来源互不依赖, 先同时开始下载, 再按顺序写入数据库
+        executor = ThreadPoolExecutor(max_workers=len(tables))
+        downloads = {}
+
+        for index in record.index:
+            table = record.loc[index, 'name']
+            _ending = record.loc[index, 'ending_date']
+
+            if current <= record.loc[index, 'renew_date']:
+                continue
+
+            if table == tables[0]:  # 北向资金流入个股数据；
+                downloads[index] = executor.submit(dle.funds_to_stock)
+
+            if table == tables[1]:
+                downloads[index] = executor.submit(dle.funds_daily_data)
+
+            if table == tables[2]:
+                start_ = _ending.strftime('%Y-%m-%d')
+                end_ = current.strftime('%Y-%m-%d')
+                downloads[index] = executor.submit(download_full_north_funds_to_board, start_, end_)
+
+        executor.shutdown(wait=False)
+
         for index in record.index:
 
             table = record.loc[index, 'name']
             id_ = record.loc[index, 'id']
 
             _ending = record.loc[index, 'ending_date']
-            _current = record.loc[index, 'renew_date']
 
-            current = pd.Timestamp('today').date()
             ending = None
 
-            if current <= _current:
-                print(f'无新数据:{table}')
+            if index not in downloads:
+                logger.info('无新数据:%s', table)
                 continue
 
             try:
-                if table == tables[0]:  # 北向资金流入个股数据；
-                    data = dle.funds_to_stock()
+                data = downloads[index].result()
 
+                if table == tables[0]:  # 北向资金流入个股数据；
                     if data.shape[0]:
                         ending = data.iloc[-1]['trade_date']
                         LoadNortFunds.append_funds2stock(data)
 
                 if table == tables[1]:
-                    data = dle.funds_daily_data()
-
                     if data.shape[0]:
                         ending = data.iloc[-1]['trade_date']
                         LoadNortFunds.append_amount(data)
 
                 if table == tables[2]:
-                    start_ = _ending.strftime('%Y-%m-%d')
-                    end_ = current.strftime('%Y-%m-%d')
-
-                    data = download_full_north_funds_to_board(start_, end_)
-
                     if data.shape[0]:
                         ending = data.iloc[-1]['TRADE_DATE']
                         LoadNortFunds.append_funds2board(data)
 
             except Exception as ex:
-                print(f'{table} 数据更新异常:\n{ex}')
+                logger.error('%s 数据更新异常:\n%s', table, ex)
 
             """ renew record data """
             if not ending or ending <= _ending:
@@ -188,7 +275,7 @@ class DataDailyRenew:  # 近期数据更新
             ending_date = '{ending}', renew_date='{current}' where id={id_}; '''
             LoadBasicInform.basic_execute_sql(sql=sql)
 
-            print(f'{table}数据更新成功;')
+            logger.info('%s数据更新成功;', table)
 
 
 class RMDownloadData(DataDailyRenew):
@@ -197,18 +284,17 @@ class RMDownloadData(DataDailyRenew):
         DataDailyRenew.__init__(self)
 
     def daily_renew_data(self):
-        now = pd.Timestamp('today')
-        open1 = pd.to_datetime('09:30')
-        close2 = pd.to_datetime('15:30')
+        now = datetime.datetime.now().time()
 
-        if now < open1:
+        if now < OPEN_TIME:
             self.renew_NorthFunds()  # 北向资金信息
 
-        elif now > close2:
+        elif now > CLOSE_TIME:
             self.download_1mData()  # 更新股票当天1m信息；
             self.renew_NorthFunds()  # 北向资金信息
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     rn = DataDailyRenew()
     rn.renew_NorthFunds()
@@ -1,10 +1,10 @@
-from struct import unpack
 import multiprocessing
 from code.MySql.DB_MySql import MysqlAlchemy as alc
 from code.MySql.DB_MySql import *
 import pandas as pd
 import pandas
 import math
+import numpy as np
 import pymysql
 from code.Normal import StockCode
 from code.Normal import ReadSaveFile
@@ -12,6 +12,14 @@ from code.Normal import ReadSaveFile
 pd.set_option('display.max_columns', None)
 pd.set_option('display.width', 500)
 
+# 通达信 lc1 分钟线记录: HHfffffif, 32 字节
+LC1_DTYPE = np.dtype([('h1', '<u2'), ('h2', '<u2'), ('open', '<f4'), ('high', '<f4'), ('low', '<f4'),
+                      ('close', '<f4'), ('money', '<f4'), ('volume', '<i4'), ('unknown', '<f4')])
+
+# 通达信 day 日线记录: IIIIIfII, 32 字节; 价格单位为分
+DAY_DTYPE = np.dtype([('date', '<u4'), ('open', '<u4'), ('high', '<u4'), ('low', '<u4'), ('close', '<u4'),
+                      ('money', '<f4'), ('volume', '<u4'), ('unknown', '<u4')])
+
 
 def tb_txd_record():
 
@@ -95,33 +103,28 @@ class TongxindaDailyData:
             ofile = open(FilePath, 'rb')
             buf = ofile.read()
             ofile.close()
-            num = len(buf)
-            no = num / 32
-            items = list()
-            b = 0
-            e = 32
-            for i in range(int(no)):
-                a = unpack('IIIIIfII', buf[b:e])
-                dd = pd.to_datetime(str(a[0])).date()
-                op = a[1] / 100.0
-                high = a[2] / 100.0
-                low = a[3] / 100.0
-                close = a[4] / 100.0
-                money = a[5]
-                vol = int(a[6] / 100.0)
-                item = [dd, op, close, high, low, vol, money]
-                items.append(item)
-
-                b = b + 32
-
-                e = e + 32
-
-            columns = ['date', 'open', 'close', 'high', 'low', 'volume', 'money']
-
-            df = pd.DataFrame(data=items, columns=columns)
 
         except FileNotFoundError:
-            df = pd.DataFrame(data=None)
+            return pd.DataFrame(data=None)
+
+        # 整个文件按 32 字节记录一次解析为结构化数组, 按列换算后一次构建 DataFrame, 不逐条 unpack
+        rec = np.frombuffer(buf, dtype=DAY_DTYPE, count=len(buf) // DAY_DTYPE.itemsize)
+
+        ymd = rec['date'].astype(np.int64)  # 日期: yyyymmdd
+        year = ymd // 10000
+        month = ymd // 100 % 100
+        day = ymd % 100
+
+        dd = ((year - 1970) * 12 + month - 1).astype('datetime64[M]').astype('datetime64[D]')
+        dd = dd + (day - 1).astype('timedelta64[D]')
+
+        df = pd.DataFrame({'date': pd.to_datetime(dd).date,
+                           'open': rec['open'] / 100.0,
+                           'close': rec['close'] / 100.0,
+                           'high': rec['high'] / 100.0,
+                           'low': rec['low'] / 100.0,
+                           'volume': (rec['volume'] // 100).astype(np.int64),
+                           'money': rec['money'].astype(np.float64)})
 
         return df
 
@@ -205,34 +208,30 @@ class TongxindaMinuteData:
             ofile = open(FilePath, 'rb')
             buf = ofile.read()
             ofile.close()
-            num = len(buf)
-            no = num / 32
-
-            items = list()
-
-            e = 32
-            b = 0
-            for i in range(int(no)):
-                a = unpack('HHfffffif', buf[b:e])
-                dd = self.get_date_str(a[0], a[1])
-                dd = pd.to_datetime(dd)
-                op = a[2]
-                high = a[3]
-                low = a[4]
-                close = a[5]
-                money = a[6]
-                vol = a[7]
-                item = [dd, op, close, high, low, vol, money]
-                items.append(item)
-
-                b = b + 32
-                e = e + 32
-
-            columns = ['date', 'open', 'close', 'high', 'low', 'volume', 'money']
-            data = pd.DataFrame(data=items, columns=columns)
 
         except FileNotFoundError:
-            data = pd.DataFrame(data=None)
+            return pd.DataFrame(data=None)
+
+        # 整个文件按 32 字节记录一次解析为结构化数组, 不逐条 unpack、拼接日期字符串
+        rec = np.frombuffer(buf, dtype=LC1_DTYPE, count=len(buf) // LC1_DTYPE.itemsize)
+
+        h1 = rec['h1'].astype(np.int64)  # H1: 日期; H2: 当日分钟数
+        year = h1 // 2048 + 2004
+        month = h1 % 2048 // 100
+        day = h1 % 2048 % 100
+
+        dd = ((year - 1970) * 12 + month - 1).astype('datetime64[M]').astype('datetime64[D]')
+        dd = dd + (day - 1).astype('timedelta64[D]')
+        dd = dd.astype('datetime64[m]') + rec['h2'].astype(np.int64).astype('timedelta64[m]')
+
+        # 文件中价格、成交额本为 float32, 保持原精度, 不再转为 float64 (转换不增加精度, 只加倍内存)
+        data = pd.DataFrame({'date': pd.to_datetime(dd),
+                             'open': rec['open'],
+                             'close': rec['close'],
+                             'high': rec['high'],
+                             'low': rec['low'],
+                             'volume': rec['volume'].astype(np.int64),
+                             'money': rec['money']})
 
         return data
 
@@ -1,11 +1,14 @@
 # -*- coding: utf-8 -*-
-import json
-from download_utils import page_source
+import logging
+from download_utils import page_source, json_loads
+import numpy as np
 import pandas as pd
 
 pd.set_option('display.max_columns', None)
 pd.set_option('display.width', 5000)
 
+logger = logging.getLogger(__name__)
+
 
 def setting_cookies():
     cookies = {}
@@ -25,7 +28,7 @@ def market_code(stock_code):
 
     else:
         mk = None
-        print(f'雪球无市场类股票：{stock_code};')
+        logger.warning('雪球无市场类股票：%s;', stock_code)
 
     return mk
 
@@ -54,33 +57,31 @@ class DownloadData:
         web_site = f'{web_title}{web_symbol}{web_days}'
 
         pagesource = page_source(web_site, headers, cookies)
-        json_data = json.loads(pagesource.text)
+        json_data = json_loads(pagesource)
         data = pd.DataFrame(json_data['data']['items'])
 
-        data.loc[:, 'timestamp'] = pd.to_datetime(data['timestamp'].values, unit='ms', utc=True
-                                                  ).tz_convert('Asia/Shanghai').strftime('%Y-%m-%d %H:%M:%S')
-
-        data.loc[:, 'timestamp'] = pd.to_datetime(data['timestamp'])
-
-        data = data[['timestamp', 'avg_price', 'current', 'high', 'low', 'volume', 'amount']]
-
-        columns_list = ['date', 'open', 'close', 'high', 'low', 'volume', 'money']
-        data.columns = columns_list
-
-        flt = ['open', 'close', 'high', 'low', 'volume']
-        data[flt] = data[flt].astype(float)
+        # 毫秒时间戳直接转为北京时间, 不再经字符串格式化后重新解析
+        dates = pd.to_datetime(data['timestamp'].to_numpy(), unit='ms', utc=True
+                               ).tz_convert('Asia/Shanghai').tz_localize(None).to_numpy()
 
-        data['volume'] = data['volume'] / 100
+        # 成交量 股 -> 整手 -> 股; 成交额取整
+        volume = (data['volume'].to_numpy(dtype=np.float64) / 100).astype(np.int64) * 100
+        money = data['amount'].to_numpy().astype(np.int64)
 
-        data[['volume', 'money']] = data[['volume', 'money']].astype('int64')
-        data['volume'] = data['volume'] * 100
-        # 删除 09：30 时间数据
-        data.loc[1, 'volume'] = data.loc[0, 'volume'] + data.loc[1, 'volume']
-        data.loc[1, 'money'] = data.loc[0, 'money'] + data.loc[1, 'money']
+        # 删除 09：30 时间数据, 成交量/额按位置并入 09:31, 不依赖索引标签
+        if dates.shape[0] > 1:
+            volume[1] += volume[0]
+            money[1] += money[0]
 
-        data = data.iloc[1:].reset_index(drop=True)
+        data = pd.DataFrame({'date': dates[1:],
+                             'open': data['avg_price'].to_numpy(dtype=np.float64)[1:],
+                             'close': data['current'].to_numpy(dtype=np.float64)[1:],
+                             'high': data['high'].to_numpy(dtype=np.float64)[1:],
+                             'low': data['low'].to_numpy(dtype=np.float64)[1:],
+                             'volume': volume[1:],
+                             'money': money[1:]})
 
-        print(f'雪球下载1m数据成功: {stock_name};')
+        logger.info('雪球下载1m数据成功: %s;', stock_name)
         return data
 
     @classmethod
@@ -96,7 +97,7 @@ class DownloadData:
         web_site = f'{title}{web_name}{web_begin}{web_end}'
 
         pagesource = page_source(web_site, headers, cookies)
-        json_data = json.loads(pagesource.text)
+        json_data = json_loads(pagesource)
         data = pd.DataFrame(json_data['data']['item'], columns=json_data['data']['column'])
 
         data.loc[:, 'timestamp'] = pd.to_datetime(data['timestamp'].values,
@@ -115,7 +116,7 @@ class DownloadData:
         data[flt] = data[flt].astype(float)
         data[['volume', 'money']] = data[['volume', 'money']].astype(int)
 
-        print(f'雪球下载daily数据成功: {stock_name};')
+        logger.info('雪球下载daily数据成功: %s;', stock_name)
 
         return data
 
@@ -133,7 +134,7 @@ class DownloadData:
         web_site = f'{title}{begin_date}{web_end}'
 
         source = page_source(web_site, headers, cookies)
-        json_data = json.loads(source.text)
+        json_data = json_loads(source)
         data = pd.DataFrame(json_data['data']['item'], columns=json_data['data']['column'])
         data.loc[:, 'timestamp'] = pd.to_datetime(data['timestamp'], unit='ms') + pd.Timedelta(hours=8)
 
@@ -142,9 +143,10 @@ class DownloadData:
         flt = ['open', 'close', 'high', 'low', 'volume', 'money']
         data[flt] = data[flt].astype(float)
 
-        print(f'雪球下载120m数据成功: {stock_name};')
+        logger.info('雪球下载120m数据成功: %s;', stock_name)
         return data
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     st = DownloadData()
@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
-import json
-from download_utils import page_source
+from download_utils import page_source, json_loads
 import time
 import pandas as pd
 
@@ -55,7 +54,7 @@ class DownloadData:
         web_site = f'{web_title}{web_time_line}{web_end}'
 
         source = page_source(url=web_site, headers=headers)
-        download_data = json.loads(source)
+        download_data = json_loads(source)
         quote = download_data['chart']['result'][0]['indicators']['quote'][0]
         quote = pd.DataFrame(data=quote)
         timestamp = pd.DataFrame(download_data['chart']['result'][0]['timestamp'], columns=['timestamp'])
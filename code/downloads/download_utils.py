@@ -1,36 +1,542 @@
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import random
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
 import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from urllib3.util.retry import Retry
 from selenium import webdriver
-from code.MySql.DB_MySql import MysqlAlchemy as msl
+
+try:
+    import fcntl
+
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+try:  # orjson 解析更快; 未安装时使用标准库 json; 各下载模块统一从此处导入
+    from orjson import loads as json_loads
+
+except ImportError:
+    from json import loads as json_loads
+
+logger = logging.getLogger(__name__)
+
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+
+# 可重试的网络异常, 模块加载时绑定一次
+NETWORK_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+REQUEST_ERROR = requests.exceptions.RequestException
+
+HOST_CONCURRENCY = 8  # 同一站点同时进行中的请求上限 (每进程)
+MAX_DRIVERS = 2  # 同时运行的浏览器实例上限 (每进程), 每个 Chrome 占用数百 MB 内存
+
+BLOCKED_RESOURCES = [  # 浏览器不加载的资源
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.woff', '*.woff2', '*.ttf']
+
+CACHE_DIR = os.path.join(tempfile.gettempdir(), 'eastmoney_cache')
+CACHE_IGNORE = {'cb', '_'}  # JSONP 回调名及时间戳, 每次请求不同, 不参与缓存键
+
+META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.I)  # 网页声明的编码
+
+URL_MARKETS = {'0': '0', '3': '0', '6': '1'}  # 代码首位 -> 东方财富市场编号 (0: 深市, 1: 沪市)
+
+MEMO = {}  # 缓存文件路径 -> (获取时间, 内容)
+MEMO_SIZE = 1024
+cache_stats = {'memory': 0, 'disk': 0, 'stale': 0, 'network': 0}  # cached_page_source 各来源命中次数
+memo_lock = threading.Lock()  # 多线程下载时同步 MEMO 写入及 cache_stats 计数
+
+refreshing = set()  # 正在后台刷新的缓存文件
+refresh_lock = threading.Lock()
+
+
+def http_session():
+    # 共用连接池, 复用 TCP/TLS 连接; 服务器错误由 urllib3 先行重试, 429 限流交给站点令牌桶处理;
+    # 连接/读取异常只由 get_response 退避重试, urllib3 不再重复重试 (否则一次失败最多会发出 9 次请求)
+    retries = Retry(total=2, connect=0, read=0, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504],
+                    respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=retries)
+
+    s = requests.Session()
+    s.mount('http://', adapter)
+    s.mount('https://', adapter)
+    return s
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    进程内共用的 Session, 首次使用时创建;
+    fork 出的子进程不沿用父进程的连接池 (套接字不能跨进程共享), 按进程号各自重建;
+    """
+    global _session, _session_pid
+
+    if _session_pid != os.getpid():
+        with _session_lock:
+            if _session_pid != os.getpid():
+                _session = http_session()
+                _session_pid = os.getpid()
+
+    return _session
+
+
+class TokenBucket:
+    """
+    多进程共享的令牌桶限流, 状态 (上次补充时间, 剩余令牌) 保存在临时目录文件中, 以文件锁同步;
+    各进程请求前先取令牌, 超出东方财富每秒请求上限时排队等待, 而不是请求失败后再退避重试;
+    """
+
+    def __init__(self, name: str, capacity=7, rate=7.0):
+        self.path = os.path.join(tempfile.gettempdir(), f'{name}.bucket')
+        self.capacity = capacity
+        self.rate = rate  # 每秒补充令牌数
+
+    @staticmethod
+    def _lock(f):
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    @staticmethod
+    def _unlock(f):
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _update(self, fun):
+        # 加锁读取状态 (上次补充时间, 剩余令牌), 由 fun(tokens) 返回 (新令牌数, 等待秒数) 并写回
+        with open(self.path, 'a+') as f:
+            self._lock(f)
+
+            try:
+                f.seek(0)
+                state = f.read().split()
+                now = time.time()
+
+                if len(state) == 2:
+                    last, tokens = float(state[0]), float(state[1])
+                    tokens = min(self.capacity, tokens + (now - last) * self.rate)
+
+                else:
+                    tokens = self.capacity
+
+                tokens, wait_time = fun(tokens)
+
+                f.seek(0)
+                f.truncate()
+                f.write(f'{now} {tokens}')
+                f.flush()
+
+            finally:
+                self._unlock(f)
+
+        return wait_time
+
+    def acquire(self):
+
+        def take(tokens):
+            if tokens >= 1:
+                return tokens - 1, 0
+
+            return tokens, (1 - tokens) / self.rate
+
+        while True:
+            wait_time = self._update(take)
+
+            if not wait_time:
+                return
+
+            time.sleep(wait_time)
+
+    def penalize(self, seconds: float):
+        # 服务器返回 429: 令牌清零并透支 seconds 秒, 所有进程对该站点的下一次请求都推迟到 Retry-After 之后
+        self._update(lambda tokens: (min(tokens, 0) - seconds * self.rate, 0))
+
+
+buckets = {}  # 站点 -> 令牌桶
+gates = {}  # 站点 -> 并发信号量
+
+
+def host_bucket(url):
+    host = urlsplit(url).netloc
+    bucket = buckets.get(host)
+
+    if bucket is None:
+        bucket = buckets.setdefault(host, TokenBucket(host.replace(':', '_')))
+
+    return bucket
+
+
+def host_gate(url):
+    host = urlsplit(url).netloc
+    gate = gates.get(host)
+
+    if gate is None:
+        gate = gates.setdefault(host, threading.BoundedSemaphore(HOST_CONCURRENCY))
+
+    return gate
+
+
+def retry_after(response):
+    # Retry-After 为秒数时按其等待; 缺失或为日期格式时使用基础退避时间
+    try:
+        return min(MAX_BACKOFF, float(response.headers.get('Retry-After')))
+
+    except (TypeError, ValueError):
+        return BASE_BACKOFF * 2
+
+
+def chrome_options():
+    # 无界面运行, 不加载图片; 只读取页面文本及链接, 无需渲染图片
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless=new')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--blink-settings=imagesEnabled=false')
+    options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+    return options
 
 
 def WebDriver():
     # TODO: how to make web driver available
-    driver = webdriver.Chrome()
+    driver = webdriver.Chrome(options=chrome_options())
+
+    # 屏蔽图片及字体请求; 样式表保留, 翻页需点击可见元素
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_RESOURCES})
     return driver
 
 
-def page_source(url, headers=None, cookies=None):
+class DriverPool:
+    """
+    复用浏览器实例: 每次启动 Chrome 需数秒, 用完放回池中供下次使用;
+    单个实例使用 max_uses 次后退出, 避免 Chrome 内存持续增长;
+    同时借出的实例最多 max_drivers 个, 多线程下载时超出的线程排队等待, 不再各自启动 Chrome;
+    使用中出错的实例直接退出, 不放回池中, 以免崩溃的会话传给之后的调用方;
+    """
+
+    def __init__(self, max_uses=100, max_drivers=MAX_DRIVERS):
+        self.idle = queue.Queue()
+        self.max_uses = max_uses
+        self.uses = {}
+        self.slots = threading.BoundedSemaphore(max_drivers)
+
+    def acquire(self):
+        self.slots.acquire()
+
+        try:
+            return self.idle.get_nowait()
+
+        except queue.Empty:
+            pass
+
+        try:
+            return WebDriver()
+
+        except BaseException:  # 启动失败, 归还名额
+            self.slots.release()
+            raise
+
+    def release(self, driver):
+        uses = self.uses.pop(id(driver), 0) + 1
+
+        try:
+            if uses >= self.max_uses:
+                self.quit(driver)
+                return
+
+            self.uses[id(driver)] = uses
+            self.idle.put(driver)
+
+        finally:
+            self.slots.release()
+
+    def discard(self, driver):
+        self.uses.pop(id(driver), None)
+
+        try:
+            self.quit(driver)
+
+        finally:
+            self.slots.release()
+
+    @contextmanager
+    def lease(self):
+        # with driver_pool.lease() as driver: 正常结束放回池中, 出现异常时退出该实例
+        driver = self.acquire()
+
+        try:
+            yield driver
+
+        except BaseException:
+            self.discard(driver)
+            raise
+
+        self.release(driver)
+
+    @staticmethod
+    def quit(driver):
+        try:
+            driver.quit()
+
+        except Exception as ex:  # 浏览器已崩溃时 quit 也会失败
+            logger.warning('浏览器退出异常: %s', ex)
+
+    def shutdown_all(self):
+        while True:
+            try:
+                driver = self.idle.get_nowait()
+
+            except queue.Empty:
+                return
+
+            self.uses.pop(id(driver), None)
+            self.quit(driver)
+
+
+driver_pool = DriverPool()
+atexit.register(driver_pool.shutdown_all)
+
+
+def sleep_backoff(attempt: int):
+    # 指数退避 + 随机抖动(full jitter), 避免多进程同时重试
+    wait_time = random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * (2 ** attempt)))
+    time.sleep(wait_time)
+
+
+def get_response(url, headers=None, cookies=None):
+    # 带限流及重试的 GET, 返回 Response; 失败返回 None
+    bucket = host_bucket(url)
+    gate = host_gate(url)
 
     i = 0
     while i < 3:
 
         try:
-            source = requests.get(url, headers=headers, cookies=cookies, timeout=(5, 10))
-            source = source.text
-            return source
+            bucket.acquire()
+
+            with gate:  # 多线程批量下载时, 同一站点最多 HOST_CONCURRENCY 个请求同时进行
+                response = get_session().get(url, headers=headers, cookies=cookies, timeout=(5, 10))
 
-        except requests.exceptions.RequestException:
+            if response.status_code == 429:  # 限流: 推迟该站点的后续请求后重试
+                bucket.penalize(retry_after(response))
+                i += 1
+                continue
+
+            return response
+
+        except NETWORK_ERRORS:
+            # 只有网络类异常才重试
             i += 1
 
+            if i < 3:
+                sleep_backoff(i)
 
-def UrlCode(code: str):
-    if code[0] == '0' or code[0] == '3':
-        code = f'0.{code}'
+        except REQUEST_ERROR as ex:
+            logger.warning('请求异常，不再重试: %s; %s', url, ex)
+            return None
+
+
+def response_encoding(response):
+    """
+    依次取 响应头 charset、网页开头 meta charset, 均未声明时按 utf-8 (东方财富接口均为 utf-8);
+    只查看响应头及内容前 1024 字节, 不经 requests 逐字节探测编码;
+    """
+    if 'charset=' in response.headers.get('Content-Type', '').lower():
+        return response.encoding
+
+    content = response.content
+
+    if content.startswith(b'\xef\xbb\xbf'):
+        return 'utf-8-sig'
+
+    match = META_CHARSET.search(content[:1024])
+    return match.group(1).decode('ascii') if match else 'utf-8'
+
+
+def response_text(response):
+    # 确定编码后只解码一次; 编码名无效时按 utf-8
+    try:
+        return response.content.decode(response_encoding(response), errors='replace')
+
+    except LookupError:
+        return response.content.decode('utf-8', errors='replace')
+
+
+def page_source(url, headers=None, cookies=None):
+    response = get_response(url, headers=headers, cookies=cookies)
+    return response_text(response) if response is not None else None
+
+
+def write_atomic(path, text):
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+    os.replace(tmp, path)  # 原子替换, 多进程读取时不会读到半个文件
+
+
+def cache_path(url):
+    parts = urlsplit(url)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in CACHE_IGNORE])
+    key = urlunsplit((parts.scheme, parts.netloc, parts.path, query, ''))
+    return os.path.join(CACHE_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+
+def remember(path, fetched, source):
+    # 超过 MEMO_SIZE 条时先淘汰最早写入的一条
+    with memo_lock:
+        if path not in MEMO and len(MEMO) >= MEMO_SIZE:
+            MEMO.pop(next(iter(MEMO)), None)
+
+        MEMO[path] = (fetched, source)
+
+
+def count_hit(source: str):
+    # += 非原子操作, 加锁计数, 避免多线程同时命中时丢失次数
+    with memo_lock:
+        cache_stats[source] += 1
 
-    elif code[0] == '6':
-        code = f'1.{code}'
 
-    else:
-        print(f'东方财富代码无分类:{code};')
+def refresh_cache(url, headers=None, cookies=None):
+    # 后台刷新缓存; 同一网址同时只刷新一次
+    path = cache_path(url)
+
+    with refresh_lock:
+        if path in refreshing:
+            return
+
+        refreshing.add(path)
+
+    def run():
+        try:
+            cached_page_source(url, headers=headers, cookies=cookies, ttl=0)
+
+        finally:
+            with refresh_lock:
+                refreshing.discard(path)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def cached_page_source(url, headers=None, cookies=None, ttl=60, stale=False):
+    """
+    带磁盘缓存的 page_source, 缓存有效期 ttl 秒; 盘中数据 ttl 取 60 秒, 已收盘历史数据可取数十天;
+    同一数据在重试及同日重复运行时直接读取缓存, 不再请求;
+    stale=True: 缓存过期时先返回旧内容, 后台线程重新请求并更新缓存 (适用于很少变化的数据);
+    """
+    path = cache_path(url)
+    now = time.time()
+
+    # 进程内缓存: 同一批次内重复请求同一数据时, 不再读取磁盘
+    memo = MEMO.get(path)
+
+    if memo is not None and now - memo[0] < ttl:
+        count_hit('memory')
+        return memo[1]
+
+    try:
+        modified = os.path.getmtime(path)
+
+        if now - modified < ttl:
+            with open(path, 'r', encoding='utf-8') as f:
+                source = f.read()
+
+            count_hit('disk')
+            remember(path, modified, source)
+            return source
+
+        if stale:
+            with open(path, 'r', encoding='utf-8') as f:
+                source = f.read()
+
+            count_hit('stale')
+            refresh_cache(url, headers=headers, cookies=cookies)
+            return source
+
+    except OSError:
+        pass
+
+    count_hit('network')
+
+    # 缓存过期: 带上次的 ETag / Last-Modified 条件请求, 内容未变 (304) 时沿用缓存, 不再传输整个响应
+    validators = {}
+
+    try:
+        with open(f'{path}.meta', 'r', encoding='utf-8') as f:
+            etag, modified = (f.read().split('\n') + ['', ''])[:2]
+
+        if etag:
+            validators['If-None-Match'] = etag
+
+        if modified:
+            validators['If-Modified-Since'] = modified
+
+    except OSError:
+        pass
+
+    # 无校验信息时直接使用调用方的请求头, 不再复制
+    request_headers = {**headers, **validators} if headers and validators else (validators or headers)
+
+    response = get_response(url, headers=request_headers, cookies=cookies)
+
+    if response is None:
+        return None
+
+    if response.status_code == 304 and validators:  # 只有 304 才沿用已缓存的内容
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                source = f.read()
+
+            os.utime(path)  # 重新计算有效期
+            remember(path, now, source)
+            return source
+
+        except OSError:  # 缓存文件已被清理, 重新完整请求
+            response = get_response(url, headers=headers, cookies=cookies)
+
+            if response is None:
+                return None
+
+    source = response_text(response)
+
+    # 只缓存成功 (2xx) 的响应及其 ETag / Last-Modified; 错误页、反爬页原样返回, 不写入缓存,
+    # 以免之后带着错误页的校验信息请求, 经 304 一直沿用错误页
+    if source and 200 <= response.status_code < 300:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        write_atomic(path, source)
+        write_atomic(f'{path}.meta', f"{response.headers.get('ETag', '')}\n{response.headers.get('Last-Modified', '')}")
+        remember(path, now, source)
+
+    return source
+
+
+def UrlCode(code: str):
+    market = URL_MARKETS.get(code[0])
+
+    if market is None:
+        logger.warning('东方财富代码无分类:%s;', code)
+        return code
 
-    return code
+    return f'{market}.{code}'
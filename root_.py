@@ -1,7 +1,11 @@
 import sys, os
 
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
 
 def file_root():
-    path_ = os.path.dirname(os.path.abspath(__file__))
-    sys.path.insert(0, path_)
-    return path_
\ No newline at end of file
+    # 根目录只计算一次; 已在 sys.path 中时不再插入, 避免每次调用 sys.path 增长一项
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+
+    return ROOT